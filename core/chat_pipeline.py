@@ -0,0 +1,151 @@
+import time
+import logging
+from typing import Dict, List, Optional
+
+from emotional_state import EmotionalAnalyzer, EmotionalState
+from context_manager import ContextManager
+from post_processor import PostProcessor
+from model_router import ModelTier
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = (
+    "You are Neuro-Lite, a professional technical support assistant. "
+    "You are efficient, polite, and factual. "
+    "Do not hallucinate. If you do not know the answer, admit it professionally."
+)
+
+class ChatPipeline:
+    """
+    Transport-free chat pipeline:
+    Emotion -> RAG -> Route -> Context -> (LLM) -> Post Processing.
+    Shared by the HTTP server and offline tooling (eval_pipeline.py).
+    """
+
+    def __init__(self, rag_engine, router, emotional_analyzer: EmotionalAnalyzer = None, policy=None):
+        self.rag_engine = rag_engine
+        self.router = router
+        self.emotional_analyzer = emotional_analyzer or EmotionalAnalyzer()
+        # Optional GenerationPolicy: per-request budget and early stopping
+        self.policy = policy
+
+    @staticmethod
+    def new_context() -> ContextManager:
+        return ContextManager(system_prompt=SYSTEM_PROMPT)
+
+    def build_messages(self, context_manager: ContextManager, user_msg: str,
+                       timings: Optional[Dict[str, float]] = None):
+        """
+        Returns (messages, emotion, (tier, plan)).
+        If timings is given, per-stage seconds are recorded into it.
+        """
+        t0 = time.perf_counter()
+
+        # 1. Emotional Analysis (Sync, fast)
+        emotion, persona_modifier = self.emotional_analyzer.analyze(user_msg)
+        t1 = time.perf_counter()
+
+        # 2. RAG Retrieval (Sync, fast)
+        context_docs = self.rag_engine.search(user_msg)
+        t2 = time.perf_counter()
+
+        # 3. Construct Prompt
+        # Inject RAG context
+        rag_context = ""
+        if context_docs:
+            rag_context = "Relevant Knowledge Base Entries:\n"
+            for doc in context_docs:
+                rag_context += f"- Q: {doc['question']} A: {doc['answer']}\n"
+            rag_context += "\n"
+        else:
+            rag_context = "No direct knowledge base entry found. Rely on general knowledge.\n"
+
+        # Pick model tier from the signals above (no inference)
+        tier, profile = self.router.route(emotion, context_docs, user_msg, len(context_manager.history))
+
+        # Inject Persona Modifier
+        current_sys_prompt = f"{context_manager.system_prompt}\n{persona_modifier}\n{rag_context}"
+
+        # Update Context Manager (Memory)
+        context_manager.add_message("user", user_msg)
+
+        # Prepare messages for LLM
+        messages = context_manager.get_full_context()
+        # Override the system prompt in the list with the augmented one
+        for m in messages:
+            if m['role'] == 'system':
+                m['content'] = current_sys_prompt
+                break
+
+        # Refine the tier profile into a per-request generation plan
+        if self.policy and tier != ModelTier.TEMPLATE:
+            kb_strength = self.router.rag_strength(user_msg, context_docs)
+            profile = self.policy.plan(profile, emotion, user_msg, context_docs, kb_strength, messages)
+        route = (tier, profile)
+        t3 = time.perf_counter()
+
+        if timings is not None:
+            timings["emotion"] = t1 - t0
+            timings["rag"] = t2 - t1
+            timings["context"] = t3 - t2
+
+        return messages, emotion, route
+
+    def generate(self, route, messages: List[Dict], result: Dict):
+        """
+        4. Inference. Yields tokens, applying the policy's early-stop rules.
+        Fills result with tokens, stop_reason, first_token_s, decode_s.
+        """
+        tier, plan = route
+        monitor = self.policy.monitor(plan) if self.policy and tier != ModelTier.TEMPLATE else None
+        start = time.perf_counter()
+        result.update(tokens=0, stop_reason="eos", first_token_s=None)
+
+        stream = self.router.stream(tier, plan, messages)
+        try:
+            for chunk in stream:
+                delta = chunk['choices'][0]['delta']
+                if 'content' not in delta:
+                    continue
+                token = delta['content']
+                if result["first_token_s"] is None:
+                    result["first_token_s"] = time.perf_counter() - start
+                result["tokens"] += 1
+                reason = monitor.feed(token) if monitor else None
+                if reason == "sentences":
+                    # Drop the start of the sentence past the cap
+                    token = token[:monitor.keep]
+                if token:
+                    yield token
+                if reason:
+                    result["stop_reason"] = reason
+                    break
+        finally:
+            # Stops llama.cpp decoding when we break out early
+            if hasattr(stream, "close"):
+                stream.close()
+
+        if result["stop_reason"] == "eos" and tier != ModelTier.TEMPLATE and result["tokens"] >= plan["max_tokens"]:
+            result["stop_reason"] = "length"
+        result["decode_s"] = time.perf_counter() - start
+        if monitor:
+            self.policy.record(plan, result["tokens"], result["decode_s"], result["stop_reason"])
+
+    @staticmethod
+    def finish(context_manager: ContextManager, full_response: str, emotion: EmotionalState) -> str:
+        """
+        5. Post Processing (after the stream completes).
+        Streamed text can't be modified once sent, so post-processing is
+        applied to the stored history for future turns.
+        """
+        # PostProcessor keys on the state name ("concerned", "frustrated")
+        processed_response = PostProcessor.process(full_response, emotion.value)
+
+        # If post processor added empathy prefix, we can't send it to client now (already streamed).
+        # COMPROMISE: Post processor logic is applied to context history for future turns.
+        # We log the diff for debugging.
+        if processed_response != full_response:
+            logger.info(f"Post-processed history: Added empathy/formatting.")
+
+        context_manager.add_message("assistant", processed_response)
+        return processed_response
@@ -0,0 +1,174 @@
+import re
+import logging
+from collections import Counter
+from typing import List, Optional
+
+from emotional_state import EmotionalState
+
+logger = logging.getLogger(__name__)
+
+# Baseline the policy is measured against (previous fixed decoding)
+FIXED_MAX_TOKENS = 256
+
+# Per message type: token budget and sentence cap (None = no cap)
+MESSAGE_TYPES = {
+    "yes_no": {"max_tokens": 96, "max_sentences": 3},
+    "kb_answer": {"max_tokens": 192, "max_sentences": None},
+    "general": {"max_tokens": 192, "max_sentences": None},
+    "procedural": {"max_tokens": 256, "max_sentences": None},
+}
+
+BASE_STOPS = ["\nUser:", "\nuser:", "<|im_end|>"]
+
+def saved_tokens(tokens: int, stop_reason: Optional[str], max_tokens: int) -> int:
+    """
+    Tokens saved vs fixed FIXED_MAX_TOKENS decoding. Policy-induced stops
+    ("length" under a reduced budget, early stops) count the remainder:
+    an upper bound, since the fixed policy might have hit EOS sooner.
+    """
+    if stop_reason in (None, "eos") or (stop_reason == "length" and max_tokens >= FIXED_MAX_TOKENS):
+        return 0
+    return max(0, FIXED_MAX_TOKENS - tokens)
+
+class StreamMonitor:
+    """
+    Early termination on the token stream.
+    feed() returns a stop reason ("sentences", "repetition") or None.
+    On "sentences", `keep` is how many chars of the last token belong to
+    the allowed sentences (the rest starts the next one).
+    """
+
+    WORD_RE = re.compile(r'\S+')
+    TERMINATORS = ".!?"
+    # "e.g." / "i.e." are caught by their inner dot
+    ABBREVIATIONS = {"etc", "vs", "cf", "approx", "mr", "mrs", "ms", "dr", "fig"}
+
+    def __init__(self, max_sentences: Optional[int] = None, ngram: int = 6, max_repeats: int = 3):
+        self.max_sentences = max_sentences
+        self.ngram = ngram
+        self.max_repeats = max_repeats
+        self.text = ""
+        self.sentences = 0
+        self.keep = None
+        self.words: List[str] = []
+        self.partial = ""
+        self.ngrams = Counter()
+
+    def _ends_sentence(self, end: int) -> bool:
+        """
+        True if text[end - 1] closes a sentence. Only called once the
+        following whitespace has arrived, so "nginx.conf" never counts.
+        """
+        word = self.text[:end].split()[-1].rstrip(self.TERMINATORS)
+        if not word or word[-1].isdigit():
+            # Stray punctuation, list numbering ("1.") or versions
+            return False
+        return "." not in word and word.lower() not in self.ABBREVIATIONS
+
+    def feed(self, token: str) -> Optional[str]:
+        start = len(self.text)
+        self.text += token
+
+        # Sentence-boundary stop: a terminator counts when whitespace follows
+        if self.max_sentences:
+            for i in range(max(start, 1), len(self.text)):
+                if (self.text[i].isspace() and self.text[i - 1] in self.TERMINATORS
+                        and self._ends_sentence(i)):
+                    self.sentences += 1
+                    if self.sentences >= self.max_sentences:
+                        self.keep = i - start
+                        return "sentences"
+
+        # Repetition: same word n-gram seen max_repeats times
+        chunk = self.partial + token
+        parts = self.WORD_RE.findall(chunk)
+        # Last word may continue in the next token
+        if parts and not chunk[-1].isspace():
+            self.partial = parts.pop()
+        else:
+            self.partial = ""
+        for word in parts:
+            self.words.append(word.lower())
+            if len(self.words) >= self.ngram:
+                gram = tuple(self.words[-self.ngram:])
+                self.ngrams[gram] += 1
+                if self.ngrams[gram] >= self.max_repeats:
+                    return "repetition"
+        return None
+
+class GenerationPolicy:
+    """
+    Derives max_tokens / stop strings / early-stop rules per request from
+    message type, RAG context size and remaining context window.
+    Tracks tokens generated and estimated latency saved vs the fixed
+    256-token policy.
+    """
+
+    YES_NO_RE = re.compile(r'^\s*(is|are|can|could|does|do|did|should|will|was|were|has|have)\b', re.IGNORECASE)
+    PROCEDURAL_RE = re.compile(r'\b(how (do|can|to|should)|steps?|install|configure|set ?up|fix|troubleshoot|guide)\b', re.IGNORECASE)
+
+    def __init__(self, n_ctx: int = 2048, kb_strong: float = 0.6):
+        self.n_ctx = n_ctx
+        self.kb_strong = kb_strong
+        self.stats = {"requests": 0, "tokens": 0, "decode_s": 0.0,
+                      "est_saved_tokens": 0, "stops": Counter()}
+
+    def classify(self, emotion: EmotionalState, message: str, kb_strength: float) -> str:
+        if self.PROCEDURAL_RE.search(message):
+            return "procedural"
+        if kb_strength >= self.kb_strong:
+            return "kb_answer"
+        if self.YES_NO_RE.match(message) and len(message) <= 120:
+            return "yes_no"
+        return "general"
+
+    def plan(self, profile: dict, emotion: EmotionalState, message: str,
+             context_docs: List[dict], kb_strength: float, messages: List[dict]) -> dict:
+        """
+        Returns the tier profile refined into a per-request plan.
+        """
+        msg_type = self.classify(emotion, message, kb_strength)
+        rule = MESSAGE_TYPES[msg_type]
+        max_tokens = min(profile["max_tokens"], rule["max_tokens"])
+
+        # A KB-backed answer needs roughly the KB answer's length
+        if msg_type == "kb_answer" and context_docs:
+            max_tokens = min(max_tokens, len(context_docs[0]["answer"]) // 4 * 2 + 48)
+
+        # Remaining context window (4 chars ~ 1 token, as in ContextManager)
+        prompt_tokens = sum(len(m["content"]) for m in messages) // 4 + 8 * len(messages)
+        max_tokens = max(16, min(max_tokens, self.n_ctx - prompt_tokens - 16))
+
+        stop = list(dict.fromkeys(profile.get("stop", []) + BASE_STOPS))
+        if rule["max_sentences"]:
+            stop.append("\n\n")
+
+        return dict(profile, max_tokens=max_tokens, stop=stop, type=msg_type,
+                    max_sentences=rule["max_sentences"])
+
+    def monitor(self, plan: dict) -> StreamMonitor:
+        return StreamMonitor(max_sentences=plan.get("max_sentences"))
+
+    def record(self, plan: dict, tokens: int, decode_s: float, stop_reason: str):
+        """
+        stop_reason: "eos", "length", or a StreamMonitor reason.
+        Saved tokens are estimated by saved_tokens().
+        """
+        self.stats["requests"] += 1
+        self.stats["tokens"] += tokens
+        self.stats["decode_s"] += decode_s
+        self.stats["stops"][stop_reason] += 1
+        self.stats["est_saved_tokens"] += saved_tokens(tokens, stop_reason, plan["max_tokens"])
+
+    def report(self) -> dict:
+        s = self.stats
+        per_token_s = s["decode_s"] / s["tokens"] if s["tokens"] else 0.0
+        return {
+            "requests": s["requests"],
+            "avg_tokens": s["tokens"] / s["requests"] if s["requests"] else 0.0,
+            "ms_per_token": 1000 * per_token_s,
+            "stops": dict(s["stops"]),
+            "est_saved_tokens": s["est_saved_tokens"],
+            "est_saved_ms_per_request": (1000 * per_token_s * s["est_saved_tokens"] / s["requests"]
+                                         if s["requests"] else 0.0),
+        }
@@ -1,12 +1,16 @@
 import os
 import sys
+import json
 import logging
 import asyncio
+import time
+import signal
+import threading
 from typing import Optional
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import StreamingResponse, HTMLResponse
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse, HTMLResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from llama_cpp import Llama
@@ -16,13 +20,29 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from emotional_state import EmotionalAnalyzer, EmotionalState
 from rag_engine import RAGEngine
 from context_manager import ContextManager
-from post_processor import PostProcessor
+from chat_pipeline import ChatPipeline, SYSTEM_PROMPT
+from stream_coalescer import TokenCoalescer, token_event, sse_event, DEFAULT_FLUSH_MS, DEFAULT_FLUSH_BYTES
+from static_assets import StaticAssetCache
+from model_router import ModelRouter, ModelTier
+from profiler import RequestProfiler
+from generation_policy import GenerationPolicy
 
 # Configuration
 MODEL_PATH = os.getenv("MODEL_PATH", "/opt/neuro-lite/models/Qwen2.5-3B-Instruct-Q4_K_M.gguf")
+SMALL_MODEL_PATH = os.getenv("SMALL_MODEL_PATH", "") # Optional fast tier (e.g. Qwen2.5-0.5B)
 DB_PATH = os.getenv("DB_PATH", "/opt/neuro-lite/data/knowledge.db")
+WEBUI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'webui')
 N_CTX = 2048 # Limit context for RAM
 N_THREADS = 3 # Optimal for i3 (Dual Core with HT)
+MODEL_MLOCK = os.getenv("MODEL_MLOCK", "0") == "1"
+ADAPTIVE_GENERATION = os.getenv("ADAPTIVE_GENERATION", "1") == "1" # Per-request budget + early stop
+STREAM_FLUSH_MS = float(os.getenv("STREAM_FLUSH_MS", DEFAULT_FLUSH_MS)) # Token coalescing window
+STREAM_FLUSH_BYTES = int(os.getenv("STREAM_FLUSH_BYTES", DEFAULT_FLUSH_BYTES))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/opt/neuro-lite/profiles") # Collapsed stacks (flamegraph)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.1"))
+PROFILE_MAX_MB = float(os.getenv("PROFILE_MAX_MB", "50")) # Per-day .folded file cap
+
+PROCESS_START = time.perf_counter()
 
 # Logging Setup
 logging.basicConfig(
@@ -34,53 +54,145 @@ logger = logging.getLogger("NeuroLite")
 
 # Global State
 llm: Optional[Llama] = None
+small_llm: Optional[Llama] = None
+router: Optional[ModelRouter] = None
 rag_engine: Optional[RAGEngine] = None
 emotional_analyzer: Optional[EmotionalAnalyzer] = None
 context_manager: Optional[ContextManager] = None
+pipeline: Optional[ChatPipeline] = None
+static_assets: Optional[StaticAssetCache] = None
+# Off until toggled (POST /admin/profiling or SIGUSR2)
+profiler = RequestProfiler(PROFILE_DIR, sample_rate=PROFILE_SAMPLE_RATE, max_file_mb=PROFILE_MAX_MB)
+
+# Startup / Readiness
+# /healthz: process is up (503 once startup failed; the process then exits).
+# /readyz: model loaded and warmed, /chat accepted.
+readiness = {"state": "starting", "detail": "", "time_to_ready_s": None}
+first_request_pending = True
+# llama.cpp contexts are not thread-safe: one decode at a time across turns
+decode_lock = threading.Lock()
+
+def load_models():
+    """
+    Blocking model load (runs in an executor thread).
+    mmap brings weights in lazily instead of reading the whole file up front.
+    """
+    if not os.path.exists(MODEL_PATH):
+        raise RuntimeError(f"Model file missing: {MODEL_PATH}")
+
+    logger.info("Loading LLM (CPU Only, mmap)...")
+    main = Llama(
+        model_path=MODEL_PATH,
+        n_ctx=N_CTX,
+        n_threads=N_THREADS,
+        n_batch=512,
+        verbose=False,
+        use_mmap=True,
+        use_mlock=MODEL_MLOCK # Pin pages once resident (slower cold start)
+    )
+    logger.info("LLM Loaded.")
+
+    # Optional small model tier
+    small = None
+    if SMALL_MODEL_PATH and os.path.exists(SMALL_MODEL_PATH):
+        try:
+            small = Llama(
+                model_path=SMALL_MODEL_PATH,
+                n_ctx=N_CTX,
+                n_threads=N_THREADS,
+                n_batch=512,
+                verbose=False,
+                use_mmap=True
+            )
+            logger.info("Small LLM Loaded.")
+        except Exception as e:
+            logger.warning(f"Small LLM unavailable, routing to main model only: {e}")
+    return main, small
+
+def warm_up(model):
+    """
+    Prefill the system prompt (llama.cpp reuses the matching KV prefix on
+    the first real request) and run a short generation to fault in weights.
+    """
+    model.create_chat_completion(
+        messages=[{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": "Hello"}],
+        max_tokens=4,
+        temperature=0.0
+    )
+
+def request_exit():
+    """
+    Startup failed: stop the process so the supervisor (systemd
+    Restart=always) restarts it, as it did when load failures crashed startup.
+    SIGTERM lets uvicorn shut down gracefully.
+    """
+    os.kill(os.getpid(), signal.SIGTERM)
+
+async def startup():
+    """
+    Background startup: KB prewarm || model load -> warm-up -> ready.
+    """
+    global llm, small_llm, router, pipeline
+    loop = asyncio.get_running_loop()
+    try:
+        kb_prewarm = loop.run_in_executor(None, rag_engine.prewarm)
+
+        readiness["state"] = "loading"
+        llm, small_llm = await loop.run_in_executor(None, load_models)
+        models = {ModelTier.MAIN: llm}
+        if small_llm:
+            models[ModelTier.SMALL] = small_llm
+        router = ModelRouter(models)
+        pipeline = ChatPipeline(rag_engine, router, emotional_analyzer,
+                                policy=GenerationPolicy(n_ctx=N_CTX) if ADAPTIVE_GENERATION else None)
+
+        readiness["state"] = "warming"
+        started = time.perf_counter()
+        await loop.run_in_executor(None, warm_up, llm)
+        if small_llm:
+            await loop.run_in_executor(None, warm_up, small_llm)
+        kb_bytes = await kb_prewarm
+        logger.info(f"Warm-up done in {time.perf_counter() - started:.2f}s (KB prewarmed: {kb_bytes} bytes)")
+
+        readiness["time_to_ready_s"] = round(time.perf_counter() - PROCESS_START, 3)
+        readiness["state"] = "ready"
+        logger.info(f"Neuro-Lite ready. Time-to-ready: {readiness['time_to_ready_s']:.2f}s")
+    except Exception as e:
+        readiness["state"] = "failed"
+        readiness["detail"] = str(e)
+        logger.critical(f"Failed to load LLM: {e}. Exiting for restart.")
+        request_exit()
 
 # Lifespan Manager
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global llm, rag_engine, emotional_analyzer, context_manager
+    global rag_engine, emotional_analyzer, context_manager, static_assets
     
     logger.info("Initializing Neuro-Lite Server...")
     
-    # 1. Init LLM
-    if not os.path.exists(MODEL_PATH):
-        logger.error(f"Model not found at {MODEL_PATH}")
-        raise RuntimeError("Model file missing.")
-    
-    logger.info("Loading LLM into memory (CPU Only)...")
+    # 0. WebUI assets (served from memory, never from disk per request)
+    static_assets = StaticAssetCache(WEBUI_DIR)
+
+    # Runtime profiling toggle: kill -USR2 <pid>
     try:
-        llm = Llama(
-            model_path=MODEL_PATH,
-            n_ctx=N_CTX,
-            n_threads=N_THREADS,
-            n_batch=512,
-            verbose=False,
-            use_mlock=True # Prevent swapping if possible
-        )
-        logger.info("LLM Loaded.")
-    except Exception as e:
-        logger.critical(f"Failed to load LLM: {e}")
-        raise
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR2, profiler.toggle)
+    except (RuntimeError, ValueError, NotImplementedError):
+        # Loop not on the main thread (embedded / test clients)
+        logger.warning("SIGUSR2 profiling toggle unavailable; use /admin/profiling.")
 
-    # 2. Init Components
+    # 1. Init Components (fast, no model needed)
     rag_engine = RAGEngine(DB_PATH)
     emotional_analyzer = EmotionalAnalyzer()
-    
-    # System Prompt
-    sys_prompt = (
-        "You are Neuro-Lite, a professional technical support assistant. "
-        "You are efficient, polite, and factual. "
-        "Do not hallucinate. If you do not know the answer, admit it professionally."
-    )
-    context_manager = ContextManager(system_prompt=sys_prompt)
+    context_manager = ChatPipeline.new_context()
+
+    # 2. Model load + warm-up in the background; HTTP is served meanwhile
+    startup_task = asyncio.create_task(startup())
 
     yield
 
     # Cleanup
     logger.info("Shutting down Neuro-Lite Server...")
+    startup_task.cancel()
 
 app = FastAPI(title="Neuro-Lite", lifespan=lifespan)
 
@@ -89,105 +201,238 @@ class ChatRequest(BaseModel):
     message: str
     user_id: str = "default"
 
-# API Endpoints
-@app.post("/chat")
-async def chat_endpoint(request: ChatRequest):
-    if not llm:
-        raise HTTPException(status_code=503, detail="Model not loaded")
+class ProfilingRequest(BaseModel):
+    enabled: bool
+    sample_rate: Optional[float] = None
 
-    user_msg = request.message
-    
-    # 1. Emotional Analysis (Sync, fast)
-    emotion, persona_modifier = emotional_analyzer.analyze(user_msg)
-    
-    # 2. RAG Retrieval (Sync, fast)
-    context_docs = rag_engine.search(user_msg)
-    
-    # 3. Construct Prompt
-    # Inject RAG context
-    rag_context = ""
-    if context_docs:
-        rag_context = "Relevant Knowledge Base Entries:\n"
-        for doc in context_docs:
-            rag_context += f"- Q: {doc['question']} A: {doc['answer']}\n"
-        rag_context += "\n"
-    else:
-        rag_context = "No direct knowledge base entry found. Rely on general knowledge.\n"
+def build_messages(user_msg: str):
+    """
+    Emotion -> RAG -> Route -> Context (see chat_pipeline).
+    Returns (messages, emotion, (tier, profile)).
+    """
+    return pipeline.build_messages(context_manager, user_msg)
 
-    # Inject Persona Modifier
-    current_sys_prompt = f"{context_manager.system_prompt}\n{persona_modifier}\n{rag_context}"
-    
-    # Update Context Manager (Memory)
-    context_manager.add_message("user", user_msg)
-    
-    # Prepare messages for LLM
-    messages = context_manager.get_full_context()
-    # Override the system prompt in the list with the augmented one
-    for m in messages:
-        if m['role'] == 'system':
-            m['content'] = current_sys_prompt
-            break
-
-    # 4. Inference (Async Stream)
-    async def generate_stream():
-        full_response = ""
+async def stream_tokens(route, messages, result: dict, session=None):
+    """
+    Runs pipeline.generate (blocking llama.cpp decode) on a worker thread
+    and yields its tokens asynchronously, so the event loop keeps serving
+    /healthz, /readyz and other sessions during a long reply.
+    Stops decoding at the next token if the consumer goes away.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    cancelled = threading.Event()
+    end = object()
+
+    def produce():
         try:
-            # llama-cpp-python creates a generator
-            # We run the blocking call in an executor to not block event loop
-            loop = asyncio.get_event_loop()
-            
-            # Function to call
-            def infer():
-                return llm.create_chat_completion(
-                    messages=messages,
-                    temperature=0.7,
-                    max_tokens=256, # Keep low for speed
-                    stream=True
-                )
-
-            stream = await loop.run_in_executor(None, infer)
-            
-            for chunk in stream:
-                delta = chunk['choices'][0]['delta']
-                if 'content' in delta:
-                    token = delta['content']
-                    full_response += token
-                    yield f"data: {token}\n\n"
-            
-            # 5. Post Processing (After stream completes)
-            # We apply this to the final text in the context manager, 
-            # but for SSE we can't modify already sent text.
-            # To strictly follow post-processing rules, we should ideally buffer, 
-            # but for "Fast" perception we stream raw tokens, 
-            # then we apply logic to the stored history.
-            
-            # Apply Post Processing for history storage
-            processed_response = PostProcessor.process(full_response, persona_modifier)
-            
-            # If post processor added empathy prefix, we can't send it to client now (already streamed).
-            # COMPROMISE: Post processor logic is applied to context history for future turns.
-            # We log the diff for debugging.
-            if processed_response != full_response:
-                logger.info(f"Post-processed history: Added empathy/formatting.")
-            
-            context_manager.add_message("assistant", processed_response)
-            
-            # Send End signal
-            yield "data: [DONE]\n\n"
+            with decode_lock:
+                if session:
+                    session.attach()  # Sample the decoding thread
+                tokens = pipeline.generate(route, messages, result)
+                try:
+                    for token in tokens:
+                        if cancelled.is_set():
+                            break
+                        loop.call_soon_threadsafe(queue.put_nowait, token)
+                finally:
+                    tokens.close()
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, end)
+
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is end:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+        await producer
+    finally:
+        cancelled.set()
+        if session:
+            session.attach()
+
+async def generate_events(messages, emotion: EmotionalState, route, session=None):
+    """
+    4. Inference (Async Stream). Yields transport-neutral event dicts,
+    with tokens coalesced by time/size (see stream_coalescer).
+    session: optional profiler session (owned by turn_events).
+    """
+    global first_request_pending
+    tier = route[0]
+    if session:
+        session.set_stage(f"generate_{tier.value}")
+    started = time.perf_counter()
+    full_response = ""
+    result = {}
+    coalescer = TokenCoalescer(flush_ms=STREAM_FLUSH_MS, flush_bytes=STREAM_FLUSH_BYTES)
+    try:
+        # Tokens come from the policy-aware pipeline (budget + early stop),
+        # decoded off the event loop
+        async for token in stream_tokens(route, messages, result, session):
+            full_response += token
+            text = coalescer.push(token)
+            if text:
+                yield token_event(text)
+        
+        text = coalescer.flush()
+        if text:
+            yield token_event(text)
+
+        # 5. Post Processing (After stream completes)
+        if session:
+            session.set_stage("post")
+        pipeline.finish(context_manager, full_response, emotion)
+        router.record(tier, time.perf_counter() - started)
 
+        if first_request_pending:
+            first_request_pending = False
+            logger.info(f"First request latency: {time.perf_counter() - started:.2f}s "
+                        f"(first token {result['first_token_s'] or 0:.2f}s, tier {tier.value})")
+        
+        # Send End signal
+        yield {"type": "done"}
+
+    except Exception as e:
+        logger.error(f"Streaming error: {e}")
+        yield {"type": "error"}
+
+async def turn_events(user_msg: str):
+    """
+    One chat turn as events: build_messages, then generate_events.
+    Owns the profiler session for both phases, so a session only starts
+    once the transport consumes the turn, and always ends with it.
+    When profiling is off this costs one attribute read.
+    """
+    session = profiler.begin("chat") if profiler.enabled else None
+    try:
+        if session:
+            session.set_stage("prepare")
+        try:
+            messages, emotion, route = build_messages(user_msg)
         except Exception as e:
-            logger.error(f"Streaming error: {e}")
-            yield "data: [ERROR]\n\n"
+            logger.error(f"Prepare error: {e}")
+            yield {"type": "error"}
+            return
+        async for event in generate_events(messages, emotion, route, session):
+            yield event
+    finally:
+        if session:
+            session.end()
+
+# API Endpoints
+@app.post("/chat")
+async def chat_endpoint(request: ChatRequest):
+    if readiness["state"] != "ready":
+        raise HTTPException(status_code=503, detail=f"Model {readiness['state']}", headers={"Retry-After": "5"})
+
+    async def generate_stream():
+        async for event in turn_events(request.message):
+            yield sse_event(event)
 
     return StreamingResponse(generate_stream(), media_type="text/event-stream")
 
+@app.websocket("/ws/chat")
+async def chat_websocket(websocket: WebSocket):
+    """
+    Persistent chat transport: one connection per session, many turns.
+    Client sends {"message": str}; server replies with the same JSON
+    events as /chat (token..., then done or error).
+    """
+    await websocket.accept()
+    try:
+        while True:
+            try:
+                request = ChatRequest(**json.loads(await websocket.receive_text()))
+            except (ValueError, TypeError, KeyError):
+                # Bad JSON, non-object, missing "message" or a binary frame:
+                # reject the frame, keep the session
+                await websocket.send_json({"type": "error", "detail": 'Expected {"message": str}'})
+                continue
+            if readiness["state"] != "ready":
+                await websocket.send_json({"type": "error", "detail": f"Model {readiness['state']}"})
+                continue
+            async for event in turn_events(request.message):
+                await websocket.send_json(event)
+    except WebSocketDisconnect:
+        logger.debug("WebSocket session closed.")
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is serving HTTP and startup has not failed."""
+    if readiness["state"] == "failed":
+        return JSONResponse({"status": "failed", "detail": readiness["detail"]}, status_code=503)
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 200 once the model is loaded and warmed up."""
+    status_code = 200 if readiness["state"] == "ready" else 503
+    return JSONResponse(readiness, status_code=status_code)
+
+@app.get("/stats/routing")
+async def routing_stats():
+    """Per-tier share and latency."""
+    if not router:
+        raise HTTPException(status_code=503, detail="Router not ready")
+    return router.report()
+
+LOCAL_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
+def require_local(request: Request):
+    """Admin controls are only reachable from the box itself (server binds 0.0.0.0)."""
+    if request.client is None or request.client.host not in LOCAL_HOSTS:
+        raise HTTPException(status_code=403, detail="Admin endpoints are localhost-only")
+
+@app.get("/admin/profiling")
+async def profiling_status(http_request: Request):
+    require_local(http_request)
+    return profiler.status()
+
+@app.post("/admin/profiling")
+async def set_profiling(request: ProfilingRequest, http_request: Request):
+    """Switch request profiling on/off at runtime (no restart). Localhost only."""
+    require_local(http_request)
+    if request.sample_rate is not None and not 0 < request.sample_rate <= 1:
+        raise HTTPException(status_code=422, detail="sample_rate must be in (0, 1]")
+    if request.enabled:
+        profiler.enable(request.sample_rate)
+    else:
+        profiler.disable()
+    return profiler.status()
+
+@app.get("/stats/generation")
+async def generation_stats():
+    """Average tokens per request and estimated latency saved vs fixed 256-token decoding."""
+    if not pipeline or not pipeline.policy:
+        raise HTTPException(status_code=503, detail="Adaptive generation not active")
+    return pipeline.policy.report()
+
+def serve_asset(name: str, request: Request) -> Response:
+    result = None
+    if static_assets:
+        result = static_assets.get(
+            name,
+            accept_encoding=request.headers.get("accept-encoding", ""),
+            if_none_match=request.headers.get("if-none-match", ""),
+        )
+    if result is None:
+        return HTMLResponse("<html><body><h1>WebUI not found.</h1></body></html>", status_code=404)
+    status, body, headers = result
+    return Response(content=body, status_code=status, headers=headers)
+
 @app.get("/", response_class=HTMLResponse)
-async def root():
-    index_path = os.path.join(os.path.dirname(__file__), '..', 'webui', 'index.html')
-    if not os.path.exists(index_path):
-        return "<html><body><h1>WebUI not found.</h1></body></html>"
-    with open(index_path, 'r') as f:
-        return f.read()
+async def root(request: Request):
+    return serve_asset("index.html", request)
+
+@app.get("/admin", response_class=HTMLResponse)
+async def admin(request: Request):
+    return serve_asset("admin.html", request)
 
 # Run with: uvicorn main_server:app --host 0.0.0.0 --port 8000
 if __name__ == "__main__":
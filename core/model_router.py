@@ -0,0 +1,148 @@
+import re
+import logging
+from enum import Enum
+from typing import Dict, List, Tuple
+
+from emotional_state import EmotionalState, EmotionalAnalyzer
+
+logger = logging.getLogger(__name__)
+
+class ModelTier(Enum):
+    TEMPLATE = "template"
+    SMALL = "small"
+    MAIN = "main"
+
+# Decoding profile per tier
+DECODING_PROFILES = {
+    ModelTier.TEMPLATE: {"max_tokens": 0, "stop": [], "temperature": 0.0},
+    ModelTier.SMALL: {"max_tokens": 128, "stop": ["\n\n\n"], "temperature": 0.3},
+    ModelTier.MAIN: {"max_tokens": 256, "stop": [], "temperature": 0.7},
+}
+
+TEMPLATE_REPLIES = {
+    EmotionalState.CELEBRATORY: "Glad to hear it's working! Let me know if there is anything else I can help with.",
+}
+
+class ModelRouter:
+    """
+    Confidence-based tiering. Zero inference cost:
+    uses signals the pipeline already computed (emotion, RAG hits,
+    message length, history depth).
+    Tiers: templated reply < small model < main model.
+    """
+
+    WORD_RE = re.compile(r'\w{3,}')
+    # Anything after the thanks ("... but X is broken", "now how do I ...")
+    FOLLOW_UP_RE = re.compile(
+        r'\?|\b(but|still|though|although|however|except|yet|also|another|next|'
+        r'how|what|why|where|when|which)\b', re.IGNORECASE)
+    # Asks for knowledge: needs KB support to be trusted to the small model
+    QUESTION_RE = re.compile(
+        r'\?|^\s*(how|what|why|where|when|which|who|is|are|can|could|does|do|did|'
+        r'should|will|would|explain|tell me)\b', re.IGNORECASE)
+    # The analyzer labels by keyword count, so "thanks ... broken" can still
+    # come out celebratory: any concern/frustration keyword disqualifies
+    TROUBLE_RE = re.compile("|".join(
+        p for state in (EmotionalState.CONCERNED, EmotionalState.FRUSTRATED)
+        for p in EmotionalAnalyzer.PATTERNS[state]), re.IGNORECASE)
+
+    def __init__(self, models: Dict[ModelTier, object] = None,
+                 short_chars: int = 80, ack_max_words: int = 8, small_max_chars: int = 200,
+                 small_max_history: int = 6, strong_coverage: float = 0.6):
+        # Tier -> object exposing llama_cpp's create_chat_completion
+        self.models = models or {}
+        self.short_chars = short_chars
+        self.ack_max_words = ack_max_words
+        self.small_max_chars = small_max_chars
+        self.small_max_history = small_max_history
+        self.strong_coverage = strong_coverage
+        self.stats = {tier: [] for tier in ModelTier}
+
+    def rag_strength(self, message: str, context_docs: List[dict]) -> float:
+        """
+        Share of message terms covered by the top KB hit's question (0..1).
+        """
+        if not context_docs:
+            return 0.0
+        terms = set(self.WORD_RE.findall(message.lower()))
+        if not terms:
+            return 0.0
+        hit_terms = set(self.WORD_RE.findall(context_docs[0]["question"].lower()))
+        return len(terms & hit_terms) / len(terms)
+
+    def is_acknowledgement(self, message: str) -> bool:
+        """
+        Short, pure acknowledgement: no question, follow-up or trouble signal.
+        """
+        return (len(message) <= self.short_chars
+                and len(re.findall(r'\w+', message)) <= self.ack_max_words
+                and not self.FOLLOW_UP_RE.search(message)
+                and not self.TROUBLE_RE.search(message))
+
+    def route(self, emotion: EmotionalState, context_docs: List[dict],
+              message: str, history_depth: int) -> Tuple[ModelTier, dict]:
+        """
+        Returns (tier, decoding profile).
+        """
+        length = len(message)
+
+        # 1. Pure acknowledgements ("thanks, it works!") need no model at all
+        if emotion in TEMPLATE_REPLIES and self.is_acknowledgement(message):
+            tier = ModelTier.TEMPLATE
+
+        # 2. Short turns early in a conversation go to the small model when
+        #    a strong KB hit answers them, or when they are untroubled
+        #    statements (no question the small model would answer unaided)
+        elif (ModelTier.SMALL in self.models and length <= self.small_max_chars
+              and history_depth <= self.small_max_history
+              and (self.rag_strength(message, context_docs) >= self.strong_coverage
+                   or (emotion in (EmotionalState.NEUTRAL, EmotionalState.CELEBRATORY)
+                       and not self.QUESTION_RE.search(message)))):
+            tier = ModelTier.SMALL
+
+        # 3. Everything else (frustration, long/deep threads, weak KB support)
+        else:
+            tier = ModelTier.MAIN
+
+        logger.debug(f"Routed to {tier.value} (len={length}, history={history_depth}, emotion={emotion.value})")
+        profile = DECODING_PROFILES[tier]
+        if tier == ModelTier.TEMPLATE:
+            profile = dict(profile, reply=TEMPLATE_REPLIES[emotion])
+        return tier, profile
+
+    def stream(self, tier: ModelTier, profile: dict, messages: List[dict]):
+        """
+        Streamed completion for the tier, in llama_cpp chunk format.
+        Templated replies are emitted as a single chunk.
+        """
+        if tier == ModelTier.TEMPLATE:
+            return iter([{"choices": [{"delta": {"content": profile["reply"]}}]}])
+        return self.models[tier].create_chat_completion(
+            messages=messages,
+            temperature=profile["temperature"],
+            max_tokens=profile["max_tokens"],
+            stop=profile["stop"] or None,
+            stream=True
+        )
+
+    def record(self, tier: ModelTier, latency_s: float):
+        samples = self.stats[tier]
+        samples.append(latency_s)
+        if len(samples) > 1000:
+            del samples[:len(samples) - 1000]
+
+    def report(self) -> dict:
+        """
+        Per-tier share of requests and latency (ms) over the recent window.
+        """
+        total = sum(len(s) for s in self.stats.values())
+        report = {}
+        for tier, samples in self.stats.items():
+            ordered = sorted(samples)
+            report[tier.value] = {
+                "count": len(samples),
+                "share": len(samples) / total if total else 0.0,
+                "avg_latency_ms": 1000 * sum(samples) / len(samples) if samples else 0.0,
+                "p95_latency_ms": 1000 * ordered[int(0.95 * (len(ordered) - 1))] if samples else 0.0,
+            }
+        return report
@@ -0,0 +1,135 @@
+import os
+import sys
+import time
+import random
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+class ProfileSession:
+    """
+    One sampled request. The sampler thread attributes stack samples of
+    the request's thread to the current stage.
+    """
+
+    def __init__(self, profiler: "RequestProfiler", thread_id: int, name: str):
+        self.profiler = profiler
+        self.thread_id = thread_id
+        self.name = name
+        self.stage = "start"
+        self.counts = Counter()
+
+    def set_stage(self, stage: str):
+        self.stage = stage
+
+    def attach(self):
+        """Sample the calling thread from now on (e.g. a decode worker)."""
+        self.thread_id = threading.get_ident()
+
+    def end(self):
+        self.profiler._finish(self)
+
+class RequestProfiler:
+    """
+    On-demand stack sampler for /chat.
+    Off by default; toggled at runtime (admin endpoint / SIGUSR2).
+    When off, no thread runs and callers only read `enabled`.
+    Output: collapsed stacks ("chat;stage;frame;frame count"), one
+    file per day, ready for flamegraph.pl / speedscope / inferno.
+    A day's file stops growing at max_file_mb; a session not ended
+    within max_session_s is dropped so profiling can't wedge.
+    """
+
+    def __init__(self, output_dir: str, sample_rate: float = 0.1, interval_ms: float = 5,
+                 max_file_mb: float = 50, max_session_s: float = 300):
+        self.output_dir = output_dir
+        self.sample_rate = sample_rate
+        self.interval = interval_ms / 1000.0
+        self.max_file_bytes = int(max_file_mb * 1024 * 1024)
+        self.max_session_s = max_session_s
+        self.enabled = False
+        self.session: Optional[ProfileSession] = None
+        self.lock = threading.Lock()
+        self.sampler: Optional[threading.Thread] = None
+
+    def enable(self, sample_rate: float = None):
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        self.enabled = True
+        logger.info(f"Profiling enabled (sample rate {self.sample_rate:.2f}, output {self.output_dir})")
+
+    def disable(self):
+        self.enabled = False
+        logger.info("Profiling disabled.")
+
+    def toggle(self):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+
+    def status(self) -> dict:
+        return {"enabled": self.enabled, "sample_rate": self.sample_rate,
+                "interval_ms": self.interval * 1000, "output_dir": self.output_dir,
+                "max_file_mb": self.max_file_bytes / (1024 * 1024)}
+
+    def begin(self, name: str = "chat") -> Optional[ProfileSession]:
+        """
+        Start sampling the calling thread, if this request is selected.
+        One request is profiled at a time to keep overhead bounded.
+        """
+        if not self.enabled or random.random() >= self.sample_rate:
+            return None
+        with self.lock:
+            if self.session is not None:
+                return None
+            self.session = ProfileSession(self, threading.get_ident(), name)
+            self.sampler = threading.Thread(target=self._sample, args=(self.session,),
+                                            name="profiler", daemon=True)
+            self.sampler.start()
+            return self.session
+
+    def _sample(self, session: ProfileSession):
+        deadline = time.monotonic() + self.max_session_s
+        while self.session is session:
+            if time.monotonic() > deadline:
+                with self.lock:
+                    if self.session is session:
+                        self.session = None
+                logger.warning(f"Profile session '{session.name}' not ended after {self.max_session_s}s; dropped.")
+                return
+            frame = sys._current_frames().get(session.thread_id)
+            if frame is not None:
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+                    stack.append(f"{module}:{code.co_name}")
+                    frame = frame.f_back
+                stack.reverse()
+                session.counts[";".join([session.name, session.stage] + stack)] += 1
+            time.sleep(self.interval)
+
+    def _finish(self, session: ProfileSession):
+        with self.lock:
+            if self.session is not session:
+                return
+            self.session = None
+        self.sampler.join()
+        if not session.counts:
+            return
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir, f"{session.name}-{datetime.now():%Y%m%d}.folded")
+            if os.path.exists(path) and os.path.getsize(path) >= self.max_file_bytes:
+                logger.warning(f"Profile file full ({self.max_file_bytes} bytes), sample discarded: {path}")
+                return
+            with open(path, 'a') as f:
+                for stack, count in session.counts.items():
+                    f.write(f"{stack} {count}\n")
+        except OSError as e:
+            logger.warning(f"Could not write profile: {e}")
@@ -21,7 +21,7 @@ class RAGEngine:
         return conn
 
     def _ensure_db_exists(self):
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
         try:
             with self._get_connection() as conn:
                 # Create standard table
@@ -115,3 +115,48 @@ class RAGEngine:
                 )
         except Exception as e:
             logger.error(f"RAG Insert Error: {e}")
+
+    def insert_many(self, rows: List[tuple]) -> int:
+        """
+        Bulk insert of (question, answer, source) rows.
+        Single transaction, so FTS triggers run without per-row fsync.
+        """
+        if not rows:
+            return 0
+        conn = self._get_connection()
+        try:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT INTO knowledge (question, answer, source) VALUES (?, ?, ?)",
+                rows
+            )
+            conn.execute("COMMIT")
+        except Exception as e:
+            conn.execute("ROLLBACK")
+            logger.error(f"RAG Bulk Insert Error: {e}")
+            raise
+        finally:
+            conn.close()
+        return len(rows)
+
+    def prewarm(self) -> int:
+        """
+        Pull DB pages into the OS page cache before the first query.
+        Returns bytes read.
+        """
+        size = 0
+        try:
+            with open(self.db_path, 'rb') as f:
+                if hasattr(os, "posix_fadvise"):
+                    os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+                buf = bytearray(1 << 20)
+                while True:
+                    n = f.readinto(buf)
+                    if not n:
+                        break
+                    size += n
+            # Touch FTS5 structures through SQLite as well
+            self.search("warmup")
+        except OSError as e:
+            logger.warning(f"KB prewarm failed: {e}")
+        return size
@@ -0,0 +1,110 @@
+import os
+import gzip
+import hashlib
+import logging
+import mimetypes
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """
+    Accept-Encoding with q-values (RFC 9110): gzip is acceptable if it, or
+    failing that "*", is listed with q > 0. Malformed q-values count as 0.
+    """
+    qvalues = {}
+    for item in accept_encoding.lower().split(","):
+        coding, *params = [p.strip() for p in item.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if coding:
+            qvalues[coding] = q
+    for coding in ("gzip", "x-gzip", "*"):
+        if coding in qvalues:
+            return qvalues[coding] > 0
+    return False
+
+class StaticAssetCache:
+    """
+    In-memory WebUI assets.
+    Loaded + fingerprinted once at startup; requests never touch the disk.
+    Gzip variants come from build_release (<file>.gz), or are made at load.
+    """
+
+    def __init__(self, asset_dir: str):
+        self.asset_dir = asset_dir
+        self.assets: Dict[str, dict] = {}
+        self.load()
+
+    def load(self):
+        if not os.path.isdir(self.asset_dir):
+            logger.warning(f"WebUI directory not found: {self.asset_dir}")
+            return
+        for name in sorted(os.listdir(self.asset_dir)):
+            path = os.path.join(self.asset_dir, name)
+            if name.endswith(".gz") or not os.path.isfile(path):
+                continue
+            with open(path, 'rb') as f:
+                body = f.read()
+            self.assets[name] = self._entry(name, body, self._prebuilt_gzip(path, body))
+        logger.info(f"Static assets loaded: {', '.join(self.assets) or 'none'}")
+
+    @staticmethod
+    def _prebuilt_gzip(path: str, body: bytes) -> Optional[bytes]:
+        gz_path = path + ".gz"
+        if not os.path.exists(gz_path):
+            return None
+        with open(gz_path, 'rb') as f:
+            gz_body = f.read()
+        # Ignore stale variants left over from an older build
+        if gzip.decompress(gz_body) != body:
+            logger.warning(f"Stale gzip variant ignored: {gz_path}")
+            return None
+        return gz_body
+
+    @staticmethod
+    def _entry(name: str, body: bytes, gz_body: Optional[bytes]) -> dict:
+        if gz_body is None:
+            gz_body = gzip.compress(body, compresslevel=9, mtime=0)
+        media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if media_type.startswith("text/"):
+            media_type += "; charset=utf-8"
+        etag = hashlib.sha256(body).hexdigest()[:16]
+        return {
+            "body": body,
+            "gzip": gz_body if len(gz_body) < len(body) else None,
+            "etag": f'"{etag}"',
+            "media_type": media_type,
+        }
+
+    def get(self, name: str, accept_encoding: str = "", if_none_match: str = "") -> Optional[Tuple[int, bytes, dict]]:
+        """
+        Returns (status, body, headers), or None if the asset is unknown.
+        """
+        asset = self.assets.get(name)
+        if asset is None:
+            return None
+
+        use_gzip = asset["gzip"] is not None and accepts_gzip(accept_encoding)
+        etag = asset["etag"][:-1] + '-gz"' if use_gzip else asset["etag"]
+        headers = {
+            "ETag": etag,
+            # HTML is not fingerprinted by URL: revalidate, then 304
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding",
+            "Content-Type": asset["media_type"],
+        }
+
+        client_tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        if etag in client_tags or "*" in client_tags:
+            return 304, b"", headers
+
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+            return 200, asset["gzip"], headers
+        return 200, asset["body"], headers
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark.
+
+Launches the server and measures, from process spawn:
+- time until /healthz answers (connections accepted)
+- time until /readyz returns 200 (model loaded + warmed up)
+- latency of the first /chat request (first event and full stream)
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import urllib.error
+import urllib.request
+
+CORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'core')
+
+def get_status(url: str) -> int:
+    try:
+        with urllib.request.urlopen(url, timeout=2) as r:
+            return r.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return 0
+
+def wait_for(url: str, start: float, timeout: float, proc) -> float:
+    while time.perf_counter() - start < timeout:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited with code {proc.returncode}")
+        if get_status(url) == 200:
+            return time.perf_counter() - start
+        time.sleep(0.05)
+    raise TimeoutError(f"Timed out waiting for {url}")
+
+def first_chat(base: str, message: str) -> tuple:
+    req = urllib.request.Request(
+        f"{base}/chat", data=json.dumps({"message": message}).encode(),
+        headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    first_event = None
+    with urllib.request.urlopen(req, timeout=600) as r:
+        for line in r:
+            if line.startswith(b"data: ") and first_event is None:
+                first_event = time.perf_counter() - start
+    return first_event or 0.0, time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time-to-ready and first-request latency")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--message", default="How do I restart the service?")
+    args = parser.parse_args()
+
+    base = f"http://127.0.0.1:{args.port}"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main_server:app", "--app-dir", CORE_DIR,
+         "--host", "127.0.0.1", "--port", str(args.port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        healthy = wait_for(f"{base}/healthz", start, args.timeout, proc)
+        ready = wait_for(f"{base}/readyz", start, args.timeout, proc)
+        first_event, total = first_chat(base, args.message)
+        print(f"healthz:            {healthy:8.2f} s")
+        print(f"readyz:             {ready:8.2f} s")
+        print(f"first /chat event:  {first_event:8.2f} s")
+        print(f"first /chat total:  {total:8.2f} s")
+    finally:
+        proc.terminate()
+        proc.wait()
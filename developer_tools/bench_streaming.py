@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Streaming transport benchmark against the real /chat (SSE) and /ws/chat
+(WebSocket) endpoints.
+
+Starts main_server in a child process with a stub model decoding at a fixed
+rate (no GGUF needed), once per flush window, and reports per transport:
+- server CPU per generated token (child utime + stime from /proc, Linux)
+- events per response, i.e. client-side DOM updates (rendering jank proxy)
+SSE opens one HTTP request per response; a WebSocket client keeps one
+connection for all of its responses.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import subprocess
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+
+DEV_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(DEV_DIR, '..', 'core'))
+from stream_coalescer import DEFAULT_FLUSH_MS
+
+def serve(port: int, tok_per_s: float, db_path: str):
+    """
+    Child process: the real app, with the model swapped for a stub.
+    STREAM_FLUSH_MS / STREAM_FLUSH_BYTES are read from the environment.
+    """
+    import uvicorn
+    import main_server
+    from rag_engine import RAGEngine
+    from chat_pipeline import ChatPipeline
+    from model_router import ModelRouter, ModelTier
+    sys.path.insert(0, DEV_DIR)
+    from eval_pipeline import StubLLM
+
+    main_server.rag_engine = RAGEngine(db_path)
+    main_server.router = ModelRouter({ModelTier.MAIN: StubLLM(token_latency=1.0 / tok_per_s)})
+    main_server.pipeline = ChatPipeline(main_server.rag_engine, main_server.router)
+    main_server.context_manager = ChatPipeline.new_context()
+    main_server.readiness["state"] = "ready"
+    # lifespan off: skips the real model load
+    uvicorn.run(main_server.app, host="127.0.0.1", port=port, lifespan="off", log_level="warning")
+
+def cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+def wait_ready(port: int, proc, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited with code {proc.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/readyz")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.1)
+    raise TimeoutError("Server did not become ready")
+
+def sse_client(port: int, message: str, responses: int) -> list:
+    counts = []
+    for _ in range(responses):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=600)
+        conn.request("POST", "/chat", body=json.dumps({"message": message}),
+                     headers={"Content-Type": "application/json"})
+        events = sum(1 for line in conn.getresponse() if line.startswith(b"data: "))
+        conn.close()
+        counts.append(events)
+    return counts
+
+def ws_client(port: int, message: str, responses: int) -> list:
+    from websockets.sync.client import connect
+    counts = []
+    with connect(f"ws://127.0.0.1:{port}/ws/chat") as ws:
+        for _ in range(responses):
+            ws.send(json.dumps({"message": message}))
+            events = 0
+            while True:
+                events += 1
+                if json.loads(ws.recv())["type"] in ("done", "error"):
+                    break
+            counts.append(events)
+    return counts
+
+def bench(name: str, flush_ms: float, client, pid: int, args, message: str):
+    start = cpu_seconds(pid)
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        results = pool.map(lambda _: client(args.port, message, args.responses), range(args.clients))
+        counts = [c for r in results for c in r]
+    cpu = cpu_seconds(pid) - start
+    per_token_us = cpu / (len(counts) * args.tokens) * 1e6
+    print(f"{name:<10} {flush_ms:8.0f} ms {per_token_us:10.1f} us/token  "
+          f"{sum(counts) / len(counts):7.1f} events/response")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=128, help="Tokens per response (<= 256)")
+    parser.add_argument("--tok-per-s", type=float, default=8.0, help="Stub decode rate")
+    parser.add_argument("--flush-ms", type=float, nargs="+", default=[0, DEFAULT_FLUSH_MS],
+                        help="Flush windows to compare (0 = one event per token)")
+    parser.add_argument("--clients", type=int, default=4, help="Concurrent clients")
+    parser.add_argument("--responses", type=int, default=4, help="Responses per client")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--db", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port, args.tok_per_s, args.db)
+        sys.exit(0)
+
+    # Stub echoes "Regarding: <message>" one word per token
+    rng = random.Random(0)
+    words = ["the", "server", "restart", "config", "service", "log", "port", "cache"]
+    message = " ".join(rng.choice(words) for _ in range(args.tokens - 1))
+    db_path = os.path.abspath(f"bench_streaming_{os.getpid()}.db")
+
+    print(f"{args.clients} clients x {args.responses} responses x {args.tokens} tokens @ {args.tok_per_s} tok/s")
+    try:
+        for flush_ms in args.flush_ms:
+            env = dict(os.environ, STREAM_FLUSH_MS=str(flush_ms))
+            proc = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(args.port),
+                 "--tok-per-s", str(args.tok_per_s), "--db", db_path], env=env)
+            try:
+                wait_ready(args.port, proc)
+                bench("sse", flush_ms, sse_client, proc.pid, args, message)
+                bench("websocket", flush_ms, ws_client, proc.pid, args, message)
+            finally:
+                proc.terminate()
+                proc.wait()
+    finally:
+        if os.path.exists(db_path):
+            os.remove(db_path)
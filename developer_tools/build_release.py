@@ -1,18 +1,67 @@
 #!/usr/bin/env python3
+import io
 import os
+import sys
+import gzip
+import json
+import sqlite3
+import hashlib
 import tarfile
 import logging
 import shutil
 from datetime import datetime
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'core'))
+from validate_data import iter_blocks, parse_block, entry_hash
+from rag_engine import RAGEngine
+
 logging.basicConfig(level=logging.INFO)
 
+VERSION = "1.0"
+
+# Release DB page size. Search is prefix-token FTS5 lookups: 8 KiB pages
+# (with FTS5 leaves sized to match) halve the b-tree/doclist pages read per
+# term vs SQLite's 4 KiB default, and the DB is read-only once shipped.
+DB_PAGE_SIZE = 8192
+# FTS5's default leaf size (pgsz 4050) is the 4 KiB page minus header room
+FTS5_PAGE_OVERHEAD = 46
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def read_corpus(path: str):
+    """
+    Yields (question, answer) from a corpus file.
+    .jsonl: {"q": ..., "a": ...} (distill_knowledge format)
+    .txt:   'Q: ... A: ...' blocks separated by blank lines
+    """
+    if path.endswith(".jsonl"):
+        with open(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    yield row.get("q", row.get("question")), row.get("a", row.get("answer"))
+    else:
+        for block in iter_blocks(path):
+            pair = parse_block(block)
+            if pair:
+                yield pair
+
 class ReleaseBuilder:
-    def __init__(self):
-        self.base_dir = os.getcwd()
+    def __init__(self, base_dir: str = None, corpus_dir: str = "corpus",
+                 cache_dir: str = "build_cache", page_size: int = DB_PAGE_SIZE):
+        self.base_dir = base_dir or os.getcwd()
         self.release_dir = os.path.join(self.base_dir, "release_artifact")
+        self.corpus_dir = os.path.join(self.base_dir, corpus_dir)
+        self.cache_dir = os.path.join(self.base_dir, cache_dir)
+        self.page_size = page_size
         self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.tar_name = f"neuro-lite-v1.0-{self.timestamp}.tar.gz"
+        self.tar_name = f"neuro-lite-v{VERSION}-{self.timestamp}.tar.gz"
 
     def validate_structure(self):
         required_files = [
@@ -28,44 +77,182 @@ class ReleaseBuilder:
             "modules/03_download_model.sh",
             "modules/04_setup_service.sh"
         ]
-        
+
         for f in required_files:
-            if not os.path.exists(f):
+            if not os.path.exists(os.path.join(self.base_dir, f)):
                 logging.error(f"Missing required file: {f}")
                 return False
         return True
 
+    def _corpus_files(self) -> dict:
+        files = {}
+        for root, dirs, names in os.walk(self.corpus_dir):
+            for name in sorted(names):
+                if name.endswith((".txt", ".jsonl")):
+                    path = os.path.join(root, name)
+                    files[os.path.relpath(path, self.corpus_dir)] = file_sha256(path)
+        return files
+
+    def _open_staging(self, path: str) -> sqlite3.Connection:
+        """
+        Staging DB persists across builds; a staging DB created with another
+        page_size is rebuilt in place by VACUUM.
+        corpus_files records which input hash each source's rows came from.
+        """
+        conn = sqlite3.connect(path, isolation_level=None)
+        conn.execute(f"PRAGMA page_size = {int(self.page_size)}")
+        if conn.execute("PRAGMA page_size").fetchone()[0] != self.page_size:
+            conn.execute("VACUUM")
+        conn.execute("CREATE TABLE IF NOT EXISTS corpus_files (path TEXT PRIMARY KEY, sha256 TEXT)")
+        RAGEngine(path)  # knowledge + FTS5 + sync triggers
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS knowledge_hashes (
+                hash TEXT PRIMARY KEY,
+                knowledge_id INTEGER
+            )
+        """)
+        return conn
+
+    def build_knowledge_db(self) -> dict:
+        """
+        Build an optimized, prebuilt knowledge DB from corpus/.
+        Incremental: inputs whose sha256 is unchanged are not re-ingested,
+        and an artifact for an identical input set is reused from cache.
+        """
+        result = {"artifact": None, "rebuilt": [], "skipped": [], "cached": False}
+        if not os.path.isdir(self.corpus_dir):
+            logging.info(f"No corpus at {self.corpus_dir}. Skipping knowledge DB stage.")
+            return result
+
+        inputs = self._corpus_files()
+        digest = hashlib.sha256(json.dumps(
+            {"version": VERSION, "page_size": self.page_size, "inputs": inputs}, sort_keys=True
+        ).encode()).hexdigest()
+        artifact = os.path.join(self.cache_dir, f"knowledge-v{VERSION}-{digest[:12]}.tar.gz")
+        result["artifact"] = artifact
+
+        if os.path.exists(artifact):
+            logging.info(f"Knowledge DB artifact up to date: {artifact}")
+            result["skipped"] = sorted(inputs)
+            result["cached"] = True
+            return result
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        conn = self._open_staging(os.path.join(self.cache_dir, "knowledge_staging.db"))
+        try:
+            built = dict(conn.execute("SELECT path, sha256 FROM corpus_files").fetchall())
+            conn.execute("BEGIN")
+            for path in built:
+                if inputs.get(path) != built[path]:
+                    conn.execute("DELETE FROM knowledge WHERE source = ?", (f"corpus:{path}",))
+                    conn.execute("DELETE FROM corpus_files WHERE path = ?", (path,))
+            for path, sha in inputs.items():
+                if built.get(path) == sha:
+                    result["skipped"].append(path)
+                    continue
+                rows = [(q, a, f"corpus:{path}")
+                        for q, a in read_corpus(os.path.join(self.corpus_dir, path)) if q and a]
+                conn.executemany("INSERT INTO knowledge (question, answer, source) VALUES (?, ?, ?)", rows)
+                conn.execute("INSERT INTO corpus_files (path, sha256) VALUES (?, ?)", (path, sha))
+                result["rebuilt"].append(path)
+                logging.info(f"Ingested {len(rows)} entries from {path}")
+
+            # Dedup hashes in DataValidator's format (md5 of question || answer)
+            conn.execute("DELETE FROM knowledge_hashes")
+            conn.executemany(
+                "INSERT OR IGNORE INTO knowledge_hashes (hash, knowledge_id) VALUES (?, ?)",
+                ((entry_hash(q, a), rowid)
+                 for rowid, q, a in conn.execute("SELECT id, question, answer FROM knowledge").fetchall())
+            )
+            conn.execute("COMMIT")
+
+            # optimize rewrites all FTS5 segments at the new leaf size
+            conn.execute("INSERT INTO knowledge_fts(knowledge_fts, rank) VALUES ('pgsz', ?)",
+                         (self.page_size - FTS5_PAGE_OVERHEAD,))
+            conn.execute("INSERT INTO knowledge_fts(knowledge_fts) VALUES ('optimize')")
+            conn.execute("ANALYZE")
+            entries = conn.execute("SELECT COUNT(*) FROM knowledge").fetchone()[0]
+
+            # VACUUM INTO writes a defragmented copy, leaving staging intact
+            out_dir = os.path.join(self.cache_dir, f"knowledge-{digest[:12]}")
+            shutil.rmtree(out_dir, ignore_errors=True)
+            os.makedirs(out_dir)
+            db_file = os.path.join(out_dir, "knowledge.db")
+            conn.execute("VACUUM INTO ?", (db_file,))
+        finally:
+            conn.close()
+
+        manifest = {
+            "version": VERSION,
+            "page_size": self.page_size,
+            "entries": entries,
+            "inputs": inputs,
+            "input_digest": digest,
+            "db_sha256": file_sha256(db_file),
+        }
+        with open(os.path.join(out_dir, "manifest.json"), 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+
+        with tarfile.open(artifact, "w:gz") as tar:
+            tar.add(db_file, arcname="data/knowledge.db")
+            tar.add(os.path.join(out_dir, "manifest.json"), arcname="data/knowledge.manifest.json")
+        shutil.rmtree(out_dir)
+
+        logging.info(f"Knowledge DB artifact created: {artifact} ({entries} entries)")
+        return result
+
+    @staticmethod
+    def _add_precompressed(tar: tarfile.TarFile, filepath: str, arcname: str):
+        """
+        Ship <asset>.gz next to each WebUI asset (served by StaticAssetCache).
+        mtime=0 keeps the output byte-identical across builds.
+        """
+        with open(filepath, 'rb') as f:
+            data = gzip.compress(f.read(), compresslevel=9, mtime=0)
+        info = tarfile.TarInfo(arcname + ".gz")
+        info.size = len(data)
+        info.mtime = int(os.path.getmtime(filepath))
+        info.mode = 0o644
+        tar.addfile(info, io.BytesIO(data))
+
     def build(self):
         if not self.validate_structure():
             logging.error("Validation failed. Aborting build.")
             return
 
         logging.info("Building release bundle...")
-        
+
         # Create temp dir
         if os.path.exists(self.release_dir):
             shutil.rmtree(self.release_dir)
-        
+
         # We don't copy model to save space/time, user downloads it.
         # We copy scripts and core code.
-        
+
         # Create Tarball directly
         with tarfile.open(self.tar_name, "w:gz") as tar:
             # Add files maintaining structure
             for root, dirs, files in os.walk(self.base_dir):
-                # Exclude venv, __pycache__, git, model files
-                dirs[:] = [d for d in dirs if d not in ['venv', '__pycache__', '.git', 'models', 'data', 'release_artifact']]
-                
+                # Exclude venv, __pycache__, git, model files, build cache, raw corpora
+                # (the knowledge DB built from corpus/ ships as its own artifact)
+                dirs[:] = [d for d in dirs if d not in ['venv', '__pycache__', '.git', 'models', 'data', 'release_artifact', 'build_cache', 'corpus']
+                           and os.path.join(root, d) not in (self.corpus_dir, self.cache_dir)]
+
                 for file in files:
                     if file.endswith('.pyc') or file.endswith('.gguf'):
                         continue
-                    
+
                     filepath = os.path.join(root, file)
                     arcname = os.path.relpath(filepath, self.base_dir)
                     tar.add(filepath, arcname=arcname)
+                    if arcname.startswith("webui" + os.sep) and not file.endswith(".gz"):
+                        self._add_precompressed(tar, filepath, arcname)
 
         logging.info(f"Release bundle created: {self.tar_name}")
 
+        # Knowledge DB ships as its own artifact, cached by input content hash
+        self.build_knowledge_db()
+
 if __name__ == "__main__":
     builder = ReleaseBuilder()
     builder.build()
@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 import sqlite3
 import time
+import random
 import logging
+import threading
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Mocking Premium AI API Interface
 class PremiumAIClient:
@@ -11,14 +14,17 @@ class PremiumAIClient:
     Mock interface for a premium AI (e.g., GPT-4).
     In production, replace with actual API calls.
     """
+    def __init__(self, latency: float = 0.5):
+        self.latency = latency
+
     def generate_sop(self, topic: str) -> list:
         """
         Returns a list of Q&A pairs.
         """
         # Mock data for demonstration
         logging.info(f"Generating SOP for topic: {topic}")
-        time.sleep(0.5) # Simulate latency
-        
+        time.sleep(self.latency) # Simulate latency
+
         if "install" in topic.lower():
             return [
                 {"q": "How do I install dependencies?", "a": "Run `sudo apt-get install build-essential` and ensure you have python3-venv installed."},
@@ -30,14 +36,59 @@ class PremiumAIClient:
             ]
         return []
 
+class TokenBucket:
+    """
+    Thread-safe token bucket. acquire() blocks until a token is available.
+    """
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
 class KnowledgeDistiller:
-    def __init__(self, db_path):
+    """
+    Concurrent, resumable distillation.
+    Topics are fetched on a bounded thread pool behind a token bucket;
+    results are committed in batches together with their checkpoint rows,
+    so an interrupted run resumes without re-querying finished topics.
+    """
+    def __init__(self, db_path, ai_client=None, max_workers: int = 4,
+                 rate: float = 2.0, max_retries: int = 3,
+                 base_delay: float = 1.0, max_delay: float = 30.0,
+                 flush_every: int = 50, flush_topics: int = 20,
+                 flush_interval: float = 30.0):
+        if max_retries < 1:
+            raise ValueError(f"max_retries must be >= 1, got {max_retries}")
         self.db_path = db_path
-        self.ai_client = PremiumAIClient()
+        self.ai_client = ai_client or PremiumAIClient()
+        self.max_workers = max_workers
+        self.bucket = TokenBucket(rate)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # Flush after flush_every pairs, flush_topics topics or flush_interval
+        # seconds, whichever comes first (empty topics still get checkpointed)
+        self.flush_every = flush_every
+        self.flush_topics = flush_topics
+        self.flush_interval = flush_interval
         self._init_db()
 
     def _init_db(self):
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
         with sqlite3.connect(self.db_path) as conn:
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS knowledge (
@@ -52,32 +103,109 @@ class KnowledgeDistiller:
                     question, answer, content='knowledge', content_rowid='id'
                 )
             """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS distill_checkpoint (
+                    topic TEXT PRIMARY KEY,
+                    status TEXT,
+                    entries INTEGER,
+                    updated_at REAL
+                )
+            """)
+
+    def _finished_topics(self) -> set:
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute("SELECT topic FROM distill_checkpoint WHERE status = 'done'")
+            return {row[0] for row in rows}
 
-    def distill_batch(self, topics: list):
+    def _backoff(self, attempt: int) -> float:
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _fetch(self, topic: str) -> list:
+        """
+        Rate-limited generate_sop with retries. Raises after max_retries.
+        """
+        for attempt in range(self.max_retries):
+            self.bucket.acquire()
+            try:
+                return self.ai_client.generate_sop(topic)
+            except Exception as e:
+                logging.error(f"Failed to process {topic} (attempt {attempt + 1}/{self.max_retries}): {e}")
+                if attempt + 1 == self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+
+    def distill_batch(self, topics: list) -> dict:
         """
         Batch process topics into knowledge.
-        Implements retry logic.
+        Returns counts: done, skipped, failed, entries.
         """
-        for topic in topics:
-            retries = 3
-            while retries > 0:
+        stats = {"done": 0, "skipped": 0, "failed": 0, "entries": 0}
+        finished = self._finished_topics()
+        pending = []
+        for topic in dict.fromkeys(topics):
+            if topic in finished:
+                stats["skipped"] += 1
+            else:
+                pending.append(topic)
+
+        if stats["skipped"]:
+            logging.info(f"Resuming: skipping {stats['skipped']} finished topics.")
+
+        buffer = []  # [(topic, status, pairs)]
+        buffered_pairs = 0
+        last_flush = time.monotonic()
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            futures = {pool.submit(self._fetch, topic): topic for topic in pending}
+            for future in as_completed(futures):
+                topic = futures[future]
                 try:
-                    pairs = self.ai_client.generate_sop(topic)
-                    self._store(pairs, source="distillation")
-                    break
-                except Exception as e:
-                    logging.error(f"Failed to process {topic}: {e}")
-                    retries -= 1
-                    time.sleep(2)
-
-    def _store(self, qa_pairs: list, source: str):
+                    pairs = future.result()
+                    buffer.append((topic, "done", pairs))
+                    buffered_pairs += len(pairs)
+                    stats["done"] += 1
+                    stats["entries"] += len(pairs)
+                except Exception:
+                    buffer.append((topic, "failed", []))
+                    stats["failed"] += 1
+
+                if (buffered_pairs >= self.flush_every or len(buffer) >= self.flush_topics
+                        or time.monotonic() - last_flush >= self.flush_interval):
+                    self._store(buffer, source="distillation")
+                    buffer, buffered_pairs = [], 0
+                    last_flush = time.monotonic()
+        except BaseException:
+            # Interrupted: don't fetch queued topics; in-flight calls are abandoned
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            # Finished topics are checkpointed even if the run is interrupted
+            self._store(buffer, source="distillation")
+        pool.shutdown()
+
+        logging.info(f"Distillation complete. Done: {stats['done']}, Skipped: {stats['skipped']}, "
+                     f"Failed: {stats['failed']}, Entries: {stats['entries']}")
+        return stats
+
+    def _store(self, results: list, source: str):
+        """
+        Commit Q&A rows and their checkpoint rows in one transaction.
+        """
+        if not results:
+            return
+        rows = [(pair['q'], pair['a'], source) for _, _, pairs in results for pair in pairs]
+        now = time.time()
         with sqlite3.connect(self.db_path) as conn:
-            for pair in qa_pairs:
-                conn.execute(
-                    "INSERT INTO knowledge (question, answer, source) VALUES (?, ?, ?)",
-                    (pair['q'], pair['a'], source)
-                )
-        logging.info(f"Stored {len(qa_pairs)} knowledge entries.")
+            conn.executemany(
+                "INSERT INTO knowledge (question, answer, source) VALUES (?, ?, ?)",
+                rows
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO distill_checkpoint (topic, status, entries, updated_at) VALUES (?, ?, ?, ?)",
+                [(topic, status, len(pairs), now) for topic, status, pairs in results]
+            )
+        logging.info(f"Stored {len(rows)} knowledge entries.")
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
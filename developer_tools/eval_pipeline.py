@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Offline batch evaluation of the full chat pipeline (no HTTP).
+
+Streams a JSONL file of conversations through
+emotion -> RAG -> route -> context -> LLM -> post-processing
+on a pool of model worker processes.
+
+Input lines:  {"id": "c1", "turns": ["first message", "follow-up", ...]}
+              {"id": "c2", "message": "single turn"}
+Output lines: one per conversation, with per-turn output, tier, token count
+              and per-stage timings. Finished ids are skipped on rerun (resume).
+              Malformed items get {"id", "error"} and count as finished.
+Summary:      <output>.summary.json with aggregate throughput and stage latency
+              over all records, including earlier (resumed) runs.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'core'))
+from rag_engine import RAGEngine
+from model_router import ModelRouter, ModelTier
+from chat_pipeline import ChatPipeline
+from generation_policy import GenerationPolicy, FIXED_MAX_TOKENS, saved_tokens
+
+logging.basicConfig(level=logging.INFO)
+
+STAGES = ["emotion", "rag", "context", "first_token", "generate", "post"]
+
+class StubLLM:
+    """
+    Deterministic stand-in for llama_cpp.Llama.
+    Echoes the last user message word by word with a fixed per-token delay.
+    """
+    def __init__(self, token_latency: float = 0.0):
+        self.token_latency = token_latency
+
+    def create_chat_completion(self, messages, max_tokens=256, stream=True, **kwargs):
+        words = f"Regarding: {messages[-1]['content']}".split()
+        for i, word in enumerate(words[:max_tokens]):
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            yield {"choices": [{"delta": {"content": word if i == 0 else " " + word}}]}
+
+def load_model(spec: str, stub_latency: float, n_threads: int):
+    if spec == "stub":
+        return StubLLM(stub_latency)
+    from llama_cpp import Llama
+    return Llama(model_path=spec, n_ctx=2048, n_threads=n_threads, n_batch=512, verbose=False)
+
+# Per-process worker state (set by _init_worker)
+_pipeline = None
+
+def _init_worker(db_path: str, model: str, small_model: str, stub_latency: float, n_threads: int,
+                 adaptive: bool = True):
+    global _pipeline
+    logging.getLogger().setLevel(logging.WARNING)
+    models = {ModelTier.MAIN: load_model(model, stub_latency, n_threads)}
+    if small_model:
+        models[ModelTier.SMALL] = load_model(small_model, stub_latency, n_threads)
+    policy = GenerationPolicy() if adaptive else None
+    _pipeline = ChatPipeline(RAGEngine(db_path), ModelRouter(models), policy=policy)
+
+def run_conversation(item: dict) -> dict:
+    """
+    Replays one conversation through the pipeline. Runs in a worker.
+    A failing conversation yields {"id", "error"} instead of aborting the run.
+    """
+    try:
+        if "_parse_error" in item:
+            raise ValueError(item["_parse_error"])
+        return _replay(item)
+    except Exception as e:
+        return {"id": item["id"], "error": f"{type(e).__name__}: {e}"}
+
+def _replay(item: dict) -> dict:
+    context_manager = _pipeline.new_context()
+    turns = item.get("turns") or [item["message"]]
+    results = []
+    for user_msg in turns:
+        timings = {}
+        messages, emotion, (tier, profile) = _pipeline.build_messages(
+            context_manager, user_msg, timings)
+
+        result = {}
+        full_response = "".join(_pipeline.generate((tier, profile), messages, result))
+        timings["generate"] = result["decode_s"]
+        timings["first_token"] = result["first_token_s"] if result["first_token_s"] is not None else result["decode_s"]
+
+        start = time.perf_counter()
+        output = _pipeline.finish(context_manager, full_response, emotion)
+        timings["post"] = time.perf_counter() - start
+
+        results.append({"input": user_msg, "output": output, "tier": tier.value,
+                        "tokens": result["tokens"], "stop_reason": result["stop_reason"],
+                        "max_tokens": profile.get("max_tokens"), "timings": timings})
+    return {"id": item["id"], "turns": results}
+
+def iter_records(output_path: str):
+    if not os.path.exists(output_path):
+        return
+    with open(output_path, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Truncated line from an interrupted run
+                continue
+            if "id" in record:
+                yield record
+
+def finished_ids(output_path: str) -> set:
+    return {record["id"] for record in iter_records(output_path)}
+
+def ends_mid_line(path: str) -> bool:
+    if not os.path.exists(path) or not os.path.getsize(path):
+        return False
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b"\n"
+
+def iter_items(input_path: str, skip: set):
+    with open(input_path, 'r') as f:
+        for n, line in enumerate(f):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+                if not isinstance(item, dict):
+                    raise ValueError("not a JSON object")
+            except ValueError as e:
+                # Recorded as an error, so resume moves past it
+                item = {"_parse_error": f"Invalid input line: {e}"}
+            item.setdefault("id", f"line-{n}")
+            if item["id"] not in skip:
+                yield item
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+def est_saved_tokens(turns: list) -> int:
+    """
+    Upper bound on tokens saved vs fixed 256-token decoding (same rule as
+    GenerationPolicy.record).
+    """
+    return sum(saved_tokens(t["tokens"], t.get("stop_reason"), t.get("max_tokens") or FIXED_MAX_TOKENS)
+               for t in turns if t["tier"] != "template")
+
+def summarize(records: list, wall: float) -> dict:
+    turns = [t for r in records for t in r.get("turns", [])]
+    tokens = sum(t["tokens"] for t in turns)
+    tiers = {}
+    stops = {}
+    for t in turns:
+        tiers[t["tier"]] = tiers.get(t["tier"], 0) + 1
+        stops[t.get("stop_reason")] = stops.get(t.get("stop_reason"), 0) + 1
+    stages = {}
+    for stage in STAGES:
+        values = [t["timings"][stage] for t in turns if stage in t["timings"]]
+        stages[stage] = {
+            "mean_ms": 1000 * sum(values) / len(values) if values else 0.0,
+            "p50_ms": 1000 * percentile(values, 0.5),
+            "p95_ms": 1000 * percentile(values, 0.95),
+        }
+    return {
+        "conversations": len(records),
+        "errors": sum(1 for r in records if "error" in r),
+        "turns": len(turns),
+        "tokens": tokens,
+        "wall_s": wall,
+        "turns_per_s": len(turns) / wall if wall else 0.0,
+        "tokens_per_s": tokens / wall if wall else 0.0,
+        "avg_tokens": tokens / len(turns) if turns else 0.0,
+        "est_saved_tokens": est_saved_tokens(turns),
+        "tiers": tiers,
+        "stops": stops,
+        "stages": stages,
+    }
+
+def evaluate(input_path: str, output_path: str, db_path: str, model: str = "stub",
+             small_model: str = None, workers: int = 1, stub_latency: float = 0.0,
+             n_threads: int = None, adaptive: bool = True) -> dict:
+    """
+    Run (or resume) an evaluation. Returns the summary over every record
+    in output_path; "runs" lists each run's conversation count and wall time.
+    """
+    skip = finished_ids(output_path)
+    if skip:
+        logging.info(f"Resuming: {len(skip)} conversations already evaluated.")
+    workers = max(1, workers)
+    # Split cores between workers so llama.cpp threads don't oversubscribe
+    n_threads = n_threads or max(1, (os.cpu_count() or 1) // workers)
+    init_args = (db_path, model, small_model, stub_latency, n_threads, adaptive)
+
+    records = []
+    start = time.perf_counter()
+    with open(output_path, 'a') as out:
+        if ends_mid_line(output_path):
+            # Keep the next record off the truncated line
+            out.write("\n")
+
+        def emit(record):
+            # One line per finished conversation doubles as the checkpoint
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            records.append(record)
+            if "error" in record:
+                logging.warning(f"Conversation {record['id']} failed: {record['error']}")
+
+        if workers <= 1:
+            _init_worker(*init_args)
+            for item in iter_items(input_path, skip):
+                emit(run_conversation(item))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=init_args) as pool:
+                pending = set()
+                for item in iter_items(input_path, skip):
+                    pending.add(pool.submit(run_conversation, item))
+                    if len(pending) >= workers * 4:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            emit(future.result())
+                for future in as_completed(pending):
+                    emit(future.result())
+
+    # Aggregate across resumed runs: throughput over the summed wall time
+    summary_path = output_path + ".summary.json"
+    runs = []
+    if skip and os.path.exists(summary_path):
+        try:
+            with open(summary_path, 'r') as f:
+                runs = json.load(f).get("runs", [])
+        except ValueError:
+            logging.warning(f"Unreadable summary, restarting run history: {summary_path}")
+    runs.append({"conversations": len(records), "wall_s": time.perf_counter() - start})
+    summary = summarize(list(iter_records(output_path)), sum(r["wall_s"] for r in runs))
+    summary["runs"] = runs
+    with open(summary_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    logging.info(f"Evaluated {len(records)} conversations this run; {summary['conversations']} total, "
+                 f"{summary['turns']} turns, {summary['tokens_per_s']:.1f} tok/s")
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline batch evaluation of the chat pipeline")
+    parser.add_argument("input", help="JSONL conversations")
+    parser.add_argument("output", help="JSONL per-conversation results (appended; resumable)")
+    parser.add_argument("--db", default="data/knowledge.db")
+    parser.add_argument("--model", default="stub", help="GGUF path, or 'stub'")
+    parser.add_argument("--small-model", default=None, help="Optional small tier GGUF path, or 'stub'")
+    parser.add_argument("--workers", type=int, default=1, help="Model worker processes")
+    parser.add_argument("--threads", type=int, default=None, help="llama.cpp threads per worker")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="Seconds per stub token")
+    parser.add_argument("--fixed-policy", action="store_true", help="Disable adaptive generation (baseline)")
+    args = parser.parse_args()
+
+    summary = evaluate(args.input, args.output, args.db, model=args.model, small_model=args.small_model,
+                       workers=args.workers, stub_latency=args.stub_latency, n_threads=args.threads,
+                       adaptive=not args.fixed_policy)
+    print(json.dumps(summary, indent=2))
@@ -1,28 +1,118 @@
 #!/usr/bin/env python3
+import os
 import re
+import sys
+import json
+import time
 import sqlite3
 import hashlib
 import logging
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'core'))
+from rag_engine import RAGEngine
 
 logging.basicConfig(level=logging.INFO)
 
+# Regex for basic PII (Email, Phone, IP)
+PII_PATTERNS = [
+    re.compile(r'\b[\w\.-]+@[\w\.-]+\.\w{2,4}\b'), # Email
+    re.compile(r'\b(?:\+?(\d{1,3}))?[-. (]*(\d{3})[-. )]*(\d{3})[-. ]*(\d{4})\b'), # Phone
+    re.compile(r'\b(?:[0-9]{1,3}\.){3}[0-9]{1,3}\b') # IPv4
+]
+
+# Basic Toxic Keyword List (Production would use a larger set)
+TOXIC_KEYWORDS = [
+    "hate", "kill", "attack", "illegal", "fraud", "scam"
+]
+
+# Combined single-pass automata. Clean text (the common case) is rejected
+# by one scan instead of len(PII_PATTERNS) + len(TOXIC_KEYWORDS) scans.
+PII_COMBINED = re.compile("|".join(f"(?:{p.pattern})" for p in PII_PATTERNS))
+TOXIC_COMBINED = re.compile("|".join(re.escape(w) for w in TOXIC_KEYWORDS))
+
+def screen_text(text: str) -> tuple:
+    """
+    Stateless PII + toxicity screen. Returns (is_valid, reason).
+    Safe to run in worker processes.
+    """
+    # 1. PII Check
+    if PII_COMBINED.search(text):
+        return False, "PII Detected"
+
+    # 2. Toxicity Check
+    lower_text = text.lower()
+    if TOXIC_COMBINED.search(lower_text):
+        # Report the first keyword in list order (stable reason strings)
+        for word in TOXIC_KEYWORDS:
+            if word in lower_text:
+                return False, f"Toxic content ({word}) detected"
+
+    return True, "Valid"
+
+def _screen_batch(blocks: list) -> list:
+    """
+    Worker stage: screen + hash a batch of blocks.
+    Returns [(is_valid, reason, md5_hex), ...] in input order.
+    """
+    results = []
+    for block in blocks:
+        is_valid, reason = screen_text(block)
+        results.append((is_valid, reason, block_hash(block)))
+    return results
+
+def iter_blocks(filepath: str, chunk_size: int = 1 << 20):
+    """
+    Chunked reader. Yields the same blocks as content.split("\\n\\n")
+    without holding the whole file in memory.
+    """
+    buffer = ""
+    with open(filepath, 'r') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            buffer += chunk
+            parts = buffer.split("\n\n")
+            buffer = parts.pop()
+            yield from parts
+    yield buffer
+
+def parse_block(block: str):
+    """
+    Split a 'Q: ... A: ...' block into (question, answer), or None.
+    """
+    match = re.match(r'\s*Q:\s*(.*?)\s*A:\s*(.*?)\s*$', block, re.DOTALL)
+    if not match or not match.group(1) or not match.group(2):
+        return None
+    return match.group(1), match.group(2)
+
+def entry_hash(question: str, answer: str) -> str:
+    """
+    Dedup key of a knowledge row: md5 of question || answer.
+    """
+    return hashlib.md5((question + answer).encode()).hexdigest()
+
+def block_hash(block: str) -> str:
+    """
+    Dedup key of a dump block. Q&A blocks hash like the row they ingest
+    as, so duplicates are caught across runs; other blocks hash raw.
+    """
+    pair = parse_block(block)
+    if pair:
+        return entry_hash(*pair)
+    return hashlib.md5(block.encode()).hexdigest()
+
 class DataValidator:
     """
     Zero Trust Ingestion Validator.
     Checks: PII, Toxicity, Duplicates.
     """
-    
-    # Regex for basic PII (Email, Phone, IP)
-    PII_PATTERNS = [
-        re.compile(r'\b[\w\.-]+@[\w\.-]+\.\w{2,4}\b'), # Email
-        re.compile(r'\b(?:\+?(\d{1,3}))?[-. (]*(\d{3})[-. )]*(\d{3})[-. ]*(\d{4})\b'), # Phone
-        re.compile(r'\b(?:[0-9]{1,3}\.){3}[0-9]{1,3}\b') # IPv4
-    ]
 
-    # Basic Toxic Keyword List (Production would use a larger set)
-    TOXIC_KEYWORDS = [
-        "hate", "kill", "attack", "illegal", "fraud", "scam"
-    ]
+    PII_PATTERNS = PII_PATTERNS
+    TOXIC_KEYWORDS = TOXIC_KEYWORDS
 
     def __init__(self, db_path):
         self.db_path = db_path
@@ -34,10 +124,18 @@ class DataValidator:
             return
         try:
             with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.execute("SELECT question || answer FROM knowledge")
-                for row in cursor:
-                    h = hashlib.md5(row[0].encode()).hexdigest()
-                    self.hash_set.add(h)
+                # Prebuilt release DBs ship precomputed hashes (build_release.py)
+                has_hashes = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'knowledge_hashes'"
+                ).fetchone()
+                sql = "SELECT question, answer FROM knowledge"
+                if has_hashes:
+                    self.hash_set.update(row[0] for row in conn.execute("SELECT hash FROM knowledge_hashes"))
+                    # Rows added after the build (pipeline, distiller, manual inserts)
+                    sql += " WHERE id NOT IN (SELECT knowledge_id FROM knowledge_hashes)"
+                cursor = conn.execute(sql)
+                for question, answer in cursor:
+                    self.hash_set.add(entry_hash(question, answer))
         except Exception as e:
             logging.warning(f"Could not load existing hashes: {e}")
 
@@ -45,58 +143,169 @@ class DataValidator:
         """
         Returns (is_valid, reason)
         """
-        
-        # 1. PII Check
-        for pattern in self.PII_PATTERNS:
-            if pattern.search(text):
-                return False, "PII Detected"
-        
-        # 2. Toxicity Check
-        lower_text = text.lower()
-        for word in self.TOXIC_KEYWORDS:
-            if word in lower_text:
-                return False, f"Toxic content ({word}) detected"
+
+        # 1-2. PII + Toxicity Check
+        is_valid, reason = screen_text(text)
+        if not is_valid:
+            return is_valid, reason
 
         # 3. Duplicate Check
-        h = hashlib.md5(text.encode()).hexdigest()
-        if h in self.hash_set:
+        if block_hash(text) in self.hash_set:
             return False, "Duplicate entry"
-        
+
         return True, "Valid"
 
     def scan_file(self, filepath: str):
         """
         Scans a text file of Q&A pairs (format: Q: ... A: ...)
         """
-        import os
         if not os.path.exists(filepath):
             logging.error(f"File not found: {filepath}")
             return
 
         with open(filepath, 'r') as f:
             content = f.read()
-        
+
         # Simple parser for example
         blocks = content.split("\n\n")
         valid_count = 0
-        
+
         for block in blocks:
             is_valid, reason = self.validate_text(block)
             if is_valid:
-                self.hash_set.add(hashlib.md5(block.encode()).hexdigest())
+                self.hash_set.add(block_hash(block))
                 valid_count += 1
                 # Ingest logic would go here
             else:
                 logging.warning(f"REJECTED: {reason} - Content: {block[:20]}...")
-        
+
         logging.info(f"Scan complete. Valid: {valid_count}, Rejected: {len(blocks) - valid_count}")
 
+class ValidationPipeline:
+    """
+    Streaming validator for large dumps.
+    Stages: chunked reader -> process pool (PII/toxicity/hash)
+    -> ordered dedup -> batch writer (knowledge DB + rejection report).
+    Verdicts are identical to DataValidator.scan_file.
+    """
+
+    def __init__(self, validator: DataValidator, workers: int = None,
+                 batch_size: int = 2000, write_batch: int = 5000,
+                 progress_every: int = 50000):
+        self.validator = validator
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.write_batch = write_batch
+        self.progress_every = progress_every
+
+    def _batches(self, filepath: str):
+        batch = []
+        for block in iter_blocks(filepath):
+            batch.append(block)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _screened(self, filepath: str):
+        """
+        Yields (blocks, results) per batch, in file order.
+        Keeps a bounded number of batches in flight.
+        """
+        if self.workers <= 1:
+            for batch in self._batches(filepath):
+                yield batch, _screen_batch(batch)
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            in_flight = deque()
+            for batch in self._batches(filepath):
+                in_flight.append((batch, pool.submit(_screen_batch, batch)))
+                if len(in_flight) >= self.workers * 2:
+                    blocks, future = in_flight.popleft()
+                    yield blocks, future.result()
+            while in_flight:
+                blocks, future = in_flight.popleft()
+                yield blocks, future.result()
+
+    def iter_verdicts(self, filepath: str):
+        """
+        Ordered dedup stage. Yields (block, is_valid, reason).
+        """
+        hash_set = self.validator.hash_set
+        for blocks, results in self._screened(filepath):
+            for block, (is_valid, reason, h) in zip(blocks, results):
+                if is_valid:
+                    if h in hash_set:
+                        is_valid, reason = False, "Duplicate entry"
+                    else:
+                        hash_set.add(h)
+                yield block, is_valid, reason
+
+    def run(self, filepath: str, report_path: str = None, source: str = "crowdsourced") -> dict:
+        """
+        Validate filepath, ingest accepted Q&A rows and write rejected
+        rows (JSONL, with reasons) to report_path.
+        """
+        stats = {"total": 0, "valid": 0, "rejected": 0, "ingested": 0, "skipped": 0}
+        if not os.path.exists(filepath):
+            logging.error(f"File not found: {filepath}")
+            return stats
+
+        rag = RAGEngine(self.validator.db_path)
+
+        report_path = report_path or f"{filepath}.rejected.jsonl"
+        pending = []
+        start = time.time()
+
+        with open(report_path, 'w') as report:
+            for index, (block, is_valid, reason) in enumerate(self.iter_verdicts(filepath)):
+                stats["total"] += 1
+                if is_valid:
+                    stats["valid"] += 1
+                    pair = parse_block(block)
+                    if pair:
+                        pending.append((pair[0], pair[1], source))
+                    else:
+                        # Clean, but not ingestible as a Q&A row
+                        stats["skipped"] += 1
+                        reason = "Not a Q/A block"
+                else:
+                    stats["rejected"] += 1
+
+                if reason != "Valid":
+                    report.write(json.dumps({"index": index, "reason": reason, "content": block}) + "\n")
+
+                if len(pending) >= self.write_batch:
+                    stats["ingested"] += rag.insert_many(pending)
+                    pending = []
+
+                if self.progress_every and stats["total"] % self.progress_every == 0:
+                    rate = stats["total"] / max(time.time() - start, 1e-9)
+                    logging.info(f"Progress: {stats['total']} blocks ({rate:.0f}/s), "
+                                 f"Valid: {stats['valid']}, Rejected: {stats['rejected']}")
+
+        stats["ingested"] += rag.insert_many(pending)
+        logging.info(f"Pipeline complete. Valid: {stats['valid']}, Rejected: {stats['rejected']}, "
+                     f"Ingested: {stats['ingested']}, Report: {report_path}")
+        return stats
+
 if __name__ == "__main__":
-    import os
-    v = DataValidator("data/knowledge.db")
-    # Create a dummy file for testing
-    with open("temp_data.txt", "w") as f:
-        f.write("Q: What is your email? A: It is test@test.com.\n\nQ: How to code? A: Use python.")
-    
-    v.scan_file("temp_data.txt")
-    os.remove("temp_data.txt")
+    parser = argparse.ArgumentParser(description="Zero Trust ingestion validator")
+    parser.add_argument("file", nargs="?", help="Q&A dump (blocks separated by blank lines)")
+    parser.add_argument("--db", default="data/knowledge.db")
+    parser.add_argument("--report", default=None, help="Rejected rows report (JSONL)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    v = DataValidator(args.db)
+    if args.file:
+        ValidationPipeline(v, workers=args.workers).run(args.file, report_path=args.report)
+    else:
+        # Create a dummy file for testing
+        with open("temp_data.txt", "w") as f:
+            f.write("Q: What is your email? A: It is test@test.com.\n\nQ: How to code? A: Use python.")
+
+        v.scan_file("temp_data.txt")
+        os.remove("temp_data.txt")
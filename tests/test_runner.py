@@ -2,7 +2,15 @@
 import sys
 import os
 import time
+import json
 import sqlite3
+import shutil
+import tarfile
+import tempfile
+import gzip
+import threading
+import asyncio
+import types
 
 # Add core to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'core'))
@@ -12,7 +20,16 @@ from emotional_state import EmotionalAnalyzer, EmotionalState
 from rag_engine import RAGEngine
 from context_manager import ContextManager
 from post_processor import PostProcessor
-from validate_data import DataValidator
+from stream_coalescer import TokenCoalescer, sse_event
+from static_assets import StaticAssetCache
+from model_router import ModelRouter, ModelTier
+from profiler import RequestProfiler
+from generation_policy import GenerationPolicy, StreamMonitor
+from chat_pipeline import ChatPipeline
+from validate_data import DataValidator, ValidationPipeline, block_hash
+from distill_knowledge import KnowledgeDistiller, PremiumAIClient
+from build_release import ReleaseBuilder
+from eval_pipeline import evaluate
 
 def test_emotional_analyzer():
     print("[TEST] Emotional Analyzer...")
@@ -47,6 +64,18 @@ def test_rag_engine():
     os.remove(db_path)
     print("[PASS] RAG Engine")
 
+def test_rag_prewarm():
+    print("[TEST] RAG Prewarm...")
+    db_path = "test_prewarm.db"
+    if os.path.exists(db_path): os.remove(db_path)
+
+    rag = RAGEngine(db_path)
+    rag.insert("What is Neuro-Lite?", "A lightweight empathic engine.", "test")
+    assert rag.prewarm() == os.path.getsize(db_path), "Prewarm did not read the whole DB"
+
+    os.remove(db_path)
+    print("[PASS] RAG Prewarm")
+
 def test_context_manager():
     print("[TEST] Context Manager...")
     cm = ContextManager(max_history_tokens=50) # Very small for testing
@@ -76,6 +105,283 @@ def test_post_processor():
     
     print("[PASS] Post Processor")
 
+def test_stream_coalescer():
+    print("[TEST] Stream Coalescer...")
+    now = [0.0]
+    c = TokenCoalescer(flush_ms=100, flush_bytes=16, clock=lambda: now[0])
+
+    # Time-based flush
+    assert c.push("Hello") is None, "Flushed too early"
+    now[0] += 0.1
+    assert c.push(" world") == "Hello world", "Time flush failed"
+
+    # Size-based flush
+    assert c.push("a" * 16) == "a" * 16, "Size flush failed"
+    assert c.flush() is None, "Empty flush returned data"
+
+    # Default window must coalesce at the ~8 tok/s CPU decode rate
+    c = TokenCoalescer(clock=lambda: now[0])
+    events = 0
+    for _ in range(64):
+        now[0] += 0.125
+        events += c.push("tok") is not None
+    assert events <= 32, "Default flush window does not coalesce at 8 tok/s"
+
+    # Newlines inside a token must not break SSE framing
+    event = sse_event({"type": "token", "text": "line1\n\nline2"})
+    assert event.count("\n\n") == 1 and event.endswith("\n\n"), "SSE framing broken"
+    assert json.loads(event[len("data: "):])["text"] == "line1\n\nline2", "SSE payload mismatch"
+    print("[PASS] Stream Coalescer")
+
+def test_static_assets():
+    print("[TEST] Static Assets...")
+    base = tempfile.mkdtemp()
+    html = b"<html><body>" + b"Neuro-Lite " * 200 + b"</body></html>"
+    with open(os.path.join(base, "index.html"), "wb") as f:
+        f.write(html)
+    with open(os.path.join(base, "index.html.gz"), "wb") as f:
+        f.write(gzip.compress(html, mtime=0))
+
+    cache = StaticAssetCache(base)
+    shutil.rmtree(base)  # Served from memory from here on
+
+    status, body, headers = cache.get("index.html", accept_encoding="gzip, deflate")
+    assert status == 200 and headers["Content-Encoding"] == "gzip", "Gzip variant not served"
+    assert gzip.decompress(body) == html, "Gzip body mismatch"
+
+    status, body, plain = cache.get("index.html")
+    assert body == html and "Content-Encoding" not in plain, "Identity body mismatch"
+    assert plain["ETag"] != headers["ETag"], "Encodings share an ETag"
+
+    status, body, _ = cache.get("index.html", accept_encoding="gzip", if_none_match=headers["ETag"])
+    assert status == 304 and body == b"", "Conditional request not honoured"
+    assert cache.get("missing.html") is None, "Unknown asset served"
+
+    # q-values: gzip;q=0 refuses gzip, "*" covers it, junk params don't count
+    for header, gz in [("gzip;q=0", False), ("deflate, gzip;q=0.0", False), ("identity;gzip", False),
+                       ("gzip;q=0.5, identity", True), ("*", True), ("*;q=0", False), ("br, gzip;q=bad", False)]:
+        _, _, h = cache.get("index.html", accept_encoding=header)
+        assert ("Content-Encoding" in h) == gz, f"Accept-Encoding {header!r} misread"
+    print("[PASS] Static Assets")
+
+class StubModel:
+    """Stands in for llama_cpp.Llama: records decoding args, streams fixed tokens."""
+    def __init__(self, name):
+        self.name = name
+        self.calls = []
+
+    def create_chat_completion(self, messages, **kwargs):
+        self.calls.append(kwargs)
+        return iter([{"choices": [{"delta": {"content": t}}]} for t in (self.name, " reply")])
+
+def test_model_router():
+    print("[TEST] Model Router...")
+    analyzer = EmotionalAnalyzer()
+    small, main = StubModel("small"), StubModel("main")
+    router = ModelRouter({ModelTier.SMALL: small, ModelTier.MAIN: main})
+    kb = [{"question": "How do I restart the server?", "answer": "Run systemctl restart."}]
+
+    def route(msg, docs=(), depth=0):
+        emotion, _ = analyzer.analyze(msg)
+        return router.route(emotion, list(docs), msg, depth)
+
+    tier, profile = route("Thank you so much, it works perfectly!")
+    assert tier == ModelTier.TEMPLATE, "Acknowledgement not templated"
+    chunks = list(router.stream(tier, profile, []))
+    assert chunks[0]["choices"][0]["delta"]["content"] == profile["reply"], "Template reply missing"
+
+    assert route("Thanks, it works now")[0] == ModelTier.TEMPLATE, "Acknowledgement not templated"
+    # Thanks plus a new problem or follow-up must reach a model
+    for msg in ["Thanks. It works now but the login page is broken",
+                "Great, the install finished but nginx crashes on start",
+                "Thanks, works. Now how do I add SSL",
+                "Thank you! still failing though",
+                "Thanks, great, but broken again"]:
+        assert route(msg)[0] != ModelTier.TEMPLATE, f"Follow-up templated: {msg}"
+
+    tier, profile = route("How do I restart the server?", kb)
+    assert tier == ModelTier.SMALL, "Strong KB hit not routed to small model"
+    list(router.stream(tier, profile, []))
+    assert small.calls[-1]["max_tokens"] == profile["max_tokens"] < 256, "Small profile not applied"
+
+    # Questions without KB support need the main model, statements don't
+    assert route("What causes a kernel panic when nginx reloads under systemd with SELinux enforcing?")[0] \
+        == ModelTier.MAIN, "Unsupported question routed to small model"
+    assert route("Is nginx faster than apache")[0] == ModelTier.MAIN, "Unsupported question routed to small model"
+    assert route("I renamed the config file")[0] == ModelTier.SMALL, "Plain statement not routed to small model"
+    assert route("This is stupid, it keeps crashing!!")[0] == ModelTier.MAIN, "Frustration not routed to main"
+    assert route("How do I restart the server?", kb, depth=20)[0] == ModelTier.MAIN, "Deep history not routed to main"
+
+    # Without a small model the small tier is never chosen
+    assert ModelRouter({ModelTier.MAIN: main}).route(
+        EmotionalState.NEUTRAL, kb, "How do I restart the server?", 0)[0] == ModelTier.MAIN, "Missing small tier used"
+
+    router.record(ModelTier.TEMPLATE, 0.001)
+    router.record(ModelTier.MAIN, 0.5)
+    report = router.report()
+    assert report["template"]["share"] == 0.5 and report["main"]["avg_latency_ms"] == 500, "Tier report mismatch"
+    print("[PASS] Model Router")
+
+def test_eval_pipeline():
+    print("[TEST] Eval Pipeline...")
+    base = tempfile.mkdtemp()
+    db_path = os.path.join(base, "kb.db")
+    src_path = os.path.join(base, "conversations.jsonl")
+    out_path = os.path.join(base, "results.jsonl")
+    RAGEngine(db_path).insert("How do I restart the server?", "Run systemctl restart neuro-lite.", "test")
+
+    with open(src_path, "w") as f:
+        for i in range(6):
+            f.write(json.dumps({"id": f"c{i}", "turns": ["My server has a problem", "Thanks, it works!"]}) + "\n")
+
+    summary = evaluate(src_path, out_path, db_path, workers=2)
+    assert summary["conversations"] == 6 and summary["turns"] == 12, "Not all conversations evaluated"
+    assert summary["tiers"] == {"main": 6, "template": 6}, "Unexpected tier mix"
+    assert summary["stages"]["rag"]["mean_ms"] > 0, "Stage timings missing"
+
+    with open(out_path) as f:
+        record = json.loads(f.readline())
+    assert record["turns"][0]["output"].startswith("I understand the issue."), "Post-processing not applied"
+
+    # Resume after a crash mid-write: only c6 is new, summary covers all runs
+    with open(out_path, "a") as f:
+        f.write('{"id": "c6", "tur')
+    with open(src_path, "a") as f:
+        f.write(json.dumps({"id": "c6", "message": "How do I restart the server?"}) + "\n")
+    summary = evaluate(src_path, out_path, db_path, workers=1)
+    assert summary["runs"][-1]["conversations"] == 1, "Resume re-evaluated finished conversations"
+    assert summary["conversations"] == 7 and summary["turns"] == 13, "Resumed summary lost earlier runs"
+    assert len(summary["runs"]) == 2, "Run history not kept"
+    with open(out_path) as f:
+        assert json.loads(f.readlines()[-1])["id"] == "c6", "Record appended to truncated line"
+
+    # Malformed items are recorded as errors, not fatal, and not retried
+    with open(src_path, "a") as f:
+        f.write(json.dumps({"id": "c7"}) + "\n")
+        f.write("{not json\n")
+        f.write(json.dumps({"id": "c8", "message": "Is the service up?"}) + "\n")
+    summary = evaluate(src_path, out_path, db_path, workers=0)
+    assert summary["runs"][-1]["conversations"] == 3 and summary["errors"] == 2, "Bad items not recorded"
+    assert summary["conversations"] == 10 and summary["turns"] == 14, "Bad items aborted the run"
+    summary = evaluate(src_path, out_path, db_path, workers=1)
+    assert summary["runs"][-1]["conversations"] == 0, "Failed items retried on resume"
+
+    shutil.rmtree(base)
+    print("[PASS] Eval Pipeline")
+
+def test_profiler():
+    print("[TEST] Request Profiler...")
+    base = tempfile.mkdtemp()
+    profiler = RequestProfiler(base, sample_rate=1.0, interval_ms=1)
+
+    # Off: no session, no sampler thread
+    threads = threading.active_count()
+    assert profiler.begin() is None and threading.active_count() == threads, "Profiler active while off"
+
+    profiler.enable()
+    session = profiler.begin("chat")
+    assert session is not None, "Sampled request not profiled"
+    assert profiler.begin("chat") is None, "Concurrent sessions allowed"
+
+    def busy_rag():
+        end = time.time() + 0.05
+        while time.time() < end:
+            pass
+    session.set_stage("rag")
+    busy_rag()
+    session.end()
+    profiler.disable()
+
+    files = os.listdir(base)
+    assert len(files) == 1 and files[0].endswith(".folded"), "Collapsed stack file missing"
+    with open(os.path.join(base, files[0])) as f:
+        lines = f.read().splitlines()
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0 and stack.startswith("chat;"), "Bad collapsed stack format"
+    assert any(line.startswith("chat;rag;") and "test_runner:busy_rag" in line for line in lines), "Hot frame not sampled"
+
+    # A session never ended (client gone before streaming) is dropped, not leaked
+    profiler = RequestProfiler(base, sample_rate=1.0, interval_ms=1, max_session_s=0.05)
+    profiler.enable()
+    assert profiler.begin("leak") is not None, "Sampled request not profiled"
+    time.sleep(0.2)
+    assert profiler.begin("chat") is not None, "Abandoned session blocked profiling"
+
+    # Full file: no further growth
+    size = os.path.getsize(os.path.join(base, files[0]))
+    profiler = RequestProfiler(base, sample_rate=1.0, interval_ms=1, max_file_mb=size / (1024 * 1024))
+    profiler.enable()
+    session = profiler.begin("chat")
+    busy_rag()
+    session.end()
+    assert os.path.getsize(os.path.join(base, files[0])) == size, "Profile file grew past its cap"
+
+    shutil.rmtree(base)
+    print("[PASS] Request Profiler")
+
+class LoopingModel:
+    """Stub model that never emits EOS: repeats one sentence up to max_tokens."""
+    def create_chat_completion(self, messages, max_tokens=256, **kwargs):
+        words = "Restart the service with systemctl and check the logs .".split()
+        for i in range(max_tokens):
+            yield {"choices": [{"delta": {"content": " " + words[i % len(words)]}}]}
+
+class SentenceModel:
+    """Stub model: three short sentences."""
+    def create_chat_completion(self, messages, **kwargs):
+        for t in ["Yes", ".", " It", " is", " up", ".", " Extra", " words", "."]:
+            yield {"choices": [{"delta": {"content": t}}]}
+
+def test_generation_policy():
+    print("[TEST] Generation Policy...")
+    policy = GenerationPolicy(n_ctx=2048)
+    main = {"max_tokens": 256, "stop": [], "temperature": 0.7}
+    msgs = [{"role": "system", "content": "x" * 400}]
+    kb = [{"question": "How do I restart?", "answer": "Run systemctl restart neuro-lite."}]
+
+    plan = policy.plan(main, EmotionalState.NEUTRAL, "Is the service running?", [], 0.0, msgs)
+    assert plan["type"] == "yes_no" and plan["max_tokens"] < 256 and plan["max_sentences"], "Yes/no budget not applied"
+    plan = policy.plan(main, EmotionalState.NEUTRAL, "What about restarts", kb, 1.0, msgs)
+    assert plan["type"] == "kb_answer" and plan["max_tokens"] < 100, "KB answer not sized from context"
+    plan = policy.plan(main, EmotionalState.NEUTRAL, "How do I install it?", [], 0.0, msgs)
+    assert plan["max_tokens"] == 256, "Procedural answer budget reduced"
+    plan = policy.plan(main, EmotionalState.NEUTRAL, "How do I install it?", [], 0.0, [{"content": "x" * 7600}])
+    assert plan["max_tokens"] < 200, "Remaining context window ignored"
+
+    m = StreamMonitor(max_sentences=2)
+    reasons = [m.feed(t) for t in ["Yes", ".", " It", " is", " up", ".", "\nDone"]]
+    assert reasons == [None] * 6 + ["sentences"] and m.keep == 0, "Sentence stop failed"
+    assert StreamMonitor(max_sentences=1).feed("Version 2.5 is out") is None, "Decimal counted as sentence"
+    # A terminator only counts once the next character shows it ends a sentence
+    for tokens in (["Yes", ".", " Edit", " the", " nginx", ".", "conf", " file", "."],
+                   ["Use", " e", ".", "g", ".", " nginx", " -s", " reload"],
+                   ["See", " 1", ".", " Then", " etc", ". ", "ok"]):
+        m = StreamMonitor(max_sentences=2)
+        assert [m.feed(t) for t in tokens] == [None] * len(tokens), f"Early sentence stop: {tokens}"
+    m = StreamMonitor(max_sentences=2)
+    assert [m.feed(t) for t in ["Yes.", "\n\nNo.", " Done"]][-1] == "sentences", "'No.' not a sentence end"
+    m = StreamMonitor(ngram=3, max_repeats=3)
+    reasons = [m.feed(" " + t) for t in "a b c a b c a b c x".split()]
+    assert "repetition" in reasons, "Repetition not detected"
+
+    pipeline = ChatPipeline(None, ModelRouter({ModelTier.MAIN: LoopingModel()}), policy=policy)
+    result = {}
+    plan = policy.plan(main, EmotionalState.NEUTRAL, "Tell me about the service", [], 0.0, msgs)
+    tokens = list(pipeline.generate((ModelTier.MAIN, plan), msgs, result))
+    assert result["stop_reason"] == "repetition" and len(tokens) < plan["max_tokens"], "Early stop not applied"
+
+    # Sentence cap: the reply ends at the last allowed terminator
+    capped = ChatPipeline(None, ModelRouter({ModelTier.MAIN: SentenceModel()}), policy=GenerationPolicy())
+    result = {}
+    text = "".join(capped.generate((ModelTier.MAIN, dict(plan, max_sentences=2)), msgs, result))
+    assert text == "Yes. It is up." and result["stop_reason"] == "sentences", "Sentence cap leaked text"
+
+    report = policy.report()
+    assert report["requests"] == 1 and report["avg_tokens"] == len(tokens), "Token accounting mismatch"
+    assert report["est_saved_tokens"] == 256 - len(tokens), "Saved-token estimate mismatch"
+    print("[PASS] Generation Policy")
+
 def test_validator():
     print("[TEST] Data Validator...")
     db_path = "test_val.db"
@@ -95,17 +401,309 @@ def test_validator():
     valid, reason = v.validate_text("How do I restart?")
     assert valid, "Valid text rejected"
     
-    os.remove(db_path)
+    if os.path.exists(db_path): os.remove(db_path)
     print("[PASS] Data Validator")
 
+def test_validation_pipeline():
+    print("[TEST] Validation Pipeline...")
+    db_path = "test_pipe.db"
+    src_path = "test_pipe.txt"
+    report_path = "test_pipe.rejected.jsonl"
+    for p in (db_path, report_path):
+        if os.path.exists(p): os.remove(p)
+
+    blocks = [
+        "Q: How do I restart? A: Run systemctl restart neuro-lite.",
+        "Q: Contact? A: Mail admin@example.com",
+        "Q: Why? A: It was a scam.",
+        "Q: How do I restart? A: Run systemctl restart neuro-lite.",
+        "free text without structure",
+        "",
+        "Q: Server IP? A: 10.0.0.1",
+    ] * 50
+    with open(src_path, "w") as f:
+        f.write("\n\n".join(blocks))
+
+    # Reference: single-threaded path
+    ref = DataValidator(db_path)
+    expected = []
+    for block in blocks:
+        valid, reason = ref.validate_text(block)
+        if valid:
+            ref.hash_set.add(block_hash(block))
+        expected.append((valid, reason))
+
+    pipe = ValidationPipeline(DataValidator(db_path), workers=2, batch_size=16)
+    got = [(valid, reason) for _, valid, reason in pipe.iter_verdicts(src_path)]
+    assert got == expected, "Pipeline verdicts differ from single-threaded path"
+
+    stats = ValidationPipeline(DataValidator(db_path), workers=2, batch_size=16).run(src_path, report_path)
+    assert stats["valid"] == 3 and stats["ingested"] == 1, "Pipeline ingestion mismatch"
+    assert RAGEngine(db_path).search("restart"), "Accepted row not ingested"
+    with open(report_path) as f:
+        assert sum(1 for _ in f) == stats["rejected"] + stats["skipped"], "Report row count mismatch"
+
+    # Second run over the same dump: rows ingested by the first run are duplicates
+    again = ValidationPipeline(DataValidator(db_path), workers=2, batch_size=16).run(src_path, report_path)
+    assert again["ingested"] == 0, "Rows re-ingested across runs"
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM knowledge").fetchone()[0] == 1, "Duplicate rows across runs"
+
+    for p in (db_path, src_path, report_path):
+        os.remove(p)
+    print("[PASS] Validation Pipeline")
+
+class StubAIClient(PremiumAIClient):
+    """Local stub with injected latency and transient failures."""
+    def __init__(self, latency=0.05, fail_first=1, interrupt_on=None):
+        super().__init__(latency=latency)
+        self.fail_first = fail_first
+        self.interrupt_on = interrupt_on
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+
+    def generate_sop(self, topic):
+        with self.lock:
+            n = self.calls[topic] = self.calls.get(topic, 0) + 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(self.latency)
+        finally:
+            with self.lock:
+                self.active -= 1
+        if topic == self.interrupt_on:
+            raise KeyboardInterrupt
+        if n <= self.fail_first:
+            raise ConnectionError("injected failure")
+        return [{"q": f"What about {topic}?", "a": f"Answer for {topic}."}]
+
+def test_distiller():
+    print("[TEST] Knowledge Distiller...")
+    db_path = "test_distill.db"
+    if os.path.exists(db_path): os.remove(db_path)
+
+    topics = [f"topic {i}" for i in range(8)]
+    client = StubAIClient()
+    d = KnowledgeDistiller(db_path, ai_client=client, max_workers=4, rate=100,
+                           base_delay=0.01, flush_every=3)
+    stats = d.distill_batch(topics)
+    assert client.peak > 1, "Distillation not concurrent"
+    assert client.peak <= 4, "Worker bound exceeded"
+    assert stats["done"] == 8 and stats["entries"] == 8, "Retries did not recover"
+
+    # Resume: finished topics are not re-queried
+    client.calls.clear()
+    stats = d.distill_batch(topics + ["topic 8"])
+    assert stats["skipped"] == 8 and list(client.calls) == ["topic 8"], "Resume re-queried topics"
+
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM knowledge").fetchone()[0] == 9, "Row count mismatch"
+    os.remove(db_path)
+
+    try:
+        KnowledgeDistiller(db_path, ai_client=client, max_retries=0)
+        assert False, "max_retries=0 accepted"
+    except ValueError:
+        pass
+
+    # Interrupted run: queued topics are not fetched, finished ones are checkpointed
+    topics = [f"topic {i}" for i in range(20)]
+    client = StubAIClient(latency=0.02, fail_first=0, interrupt_on="topic 4")
+    d = KnowledgeDistiller(db_path, ai_client=client, max_workers=2, rate=1000, flush_every=100)
+    try:
+        d.distill_batch(topics)
+        assert False, "Interrupt not propagated"
+    except KeyboardInterrupt:
+        pass
+    assert len(client.calls) < 10, "Queued topics fetched after interrupt"
+    with sqlite3.connect(db_path) as conn:
+        checkpoints = conn.execute("SELECT COUNT(*) FROM distill_checkpoint").fetchone()[0]
+    assert checkpoints >= 4, "Finished topics lost on interrupt"
+    client.calls.clear()
+    client.interrupt_on = None
+    stats = d.distill_batch(topics)
+    assert stats["skipped"] == checkpoints and len(client.calls) == 20 - checkpoints, "Resume after interrupt failed"
+
+    os.remove(db_path)
+    print("[PASS] Knowledge Distiller")
+
+def test_knowledge_artifact():
+    print("[TEST] Knowledge DB Artifact...")
+    base = tempfile.mkdtemp()
+    corpus = os.path.join(base, "corpus")
+    os.makedirs(corpus)
+    with open(os.path.join(corpus, "faq.txt"), "w") as f:
+        f.write("Q: How do I restart? A: Run systemctl restart neuro-lite.\n\nQ: Logs? A: Use journalctl.")
+    with open(os.path.join(corpus, "sop.jsonl"), "w") as f:
+        f.write(json.dumps({"q": "What does Error 500 mean?", "a": "Internal Server Error."}) + "\n")
+
+    builder = ReleaseBuilder(base_dir=base)
+    first = builder.build_knowledge_db()
+    assert sorted(first["rebuilt"]) == ["faq.txt", "sop.jsonl"], "Initial build incomplete"
+
+    again = builder.build_knowledge_db()
+    assert again["cached"] and again["artifact"] == first["artifact"], "Unchanged inputs rebuilt"
+
+    with open(os.path.join(corpus, "sop.jsonl"), "a") as f:
+        f.write(json.dumps({"q": "Error 503?", "a": "Service unavailable."}) + "\n")
+    third = builder.build_knowledge_db()
+    assert third["rebuilt"] == ["sop.jsonl"] and third["skipped"] == ["faq.txt"], "Incremental build failed"
+
+    with tarfile.open(third["artifact"]) as tar:
+        tar.extractall(base)
+    db_path = os.path.join(base, "data", "knowledge.db")
+    with open(os.path.join(base, "data", "knowledge.manifest.json")) as f:
+        manifest = json.load(f)
+    assert manifest["entries"] == 4, "Manifest entry count mismatch"
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("PRAGMA page_size").fetchone()[0] == 8192, "page_size not applied"
+        pgsz = conn.execute("SELECT v FROM knowledge_fts_config WHERE k = 'pgsz'").fetchone()
+        assert pgsz and pgsz[0] == 8192 - 46, "FTS5 leaf size not matched to page_size"
+    assert RAGEngine(db_path).search("journalctl"), "FTS index missing from artifact"
+    assert len(DataValidator(db_path).hash_set) == 4, "Dedup hashes missing from artifact"
+
+    # Rows added after the build are still deduplicated
+    RAGEngine(db_path).insert("How do I reload nginx?", "Run nginx -s reload.")
+    valid, reason = DataValidator(db_path).validate_text("Q: How do I reload nginx? A: Run nginx -s reload.")
+    assert not valid and reason == "Duplicate entry", "Post-build row not deduplicated"
+
+    shutil.rmtree(base)
+    print("[PASS] Knowledge DB Artifact")
+
+def test_server():
+    print("[TEST] Server...")
+    try:
+        from fastapi.testclient import TestClient
+    except ImportError:
+        print("[SKIP] Server (fastapi / httpx not installed)")
+        return
+
+    base = tempfile.mkdtemp()
+    model_path = os.path.join(base, "model.gguf")
+    open(model_path, "w").close()
+    env = {"MODEL_PATH": model_path, "DB_PATH": os.path.join(base, "kb.db"),
+           "PROFILE_DIR": os.path.join(base, "profiles")}
+    saved_env = {k: os.environ.get(k) for k in env}
+    os.environ.update(env)
+
+    loaded = threading.Event()
+    class StubLlama:
+        """llama_cpp.Llama stand-in: load blocks until `loaded` is set."""
+        def __init__(self, model_path, **kwargs):
+            loaded.wait(5)
+
+        def create_chat_completion(self, messages, stream=False, **kwargs):
+            if not stream:
+                return {"choices": [{"message": {"content": "ok"}}]}
+            return iter([{"choices": [{"delta": {"content": t}}]} for t in ["Run", " systemctl", " restart", "."]])
+
+    saved_llama = sys.modules.get("llama_cpp")
+    sys.modules["llama_cpp"] = types.SimpleNamespace(Llama=StubLlama)
+    sys.modules.pop("main_server", None)
+    import main_server
+
+    def read_ws_turn(ws):
+        events = [ws.receive_json()]
+        while events[-1]["type"] not in ("done", "error"):
+            events.append(ws.receive_json())
+        return events
+
+    try:
+        with TestClient(main_server.app) as client:
+            # Model still loading: live, not ready, chat refused on both transports
+            assert client.get("/healthz").status_code == 200, "Liveness gated on model load"
+            assert client.get("/readyz").status_code == 503, "Ready before model load"
+            r = client.post("/chat", json={"message": "hi"})
+            assert r.status_code == 503 and "Retry-After" in r.headers, "/chat not gated on readiness"
+            with client.websocket_connect("/ws/chat") as ws:
+                ws.send_json({"message": "hi"})
+                assert ws.receive_json()["type"] == "error", "/ws/chat not gated on readiness"
+
+            loaded.set()
+            deadline = time.time() + 5
+            while client.get("/readyz").status_code != 200:
+                assert time.time() < deadline, "Server never became ready"
+                time.sleep(0.02)
+
+            r = client.post("/chat", json={"message": "How do I restart it?"})
+            events = [json.loads(line[len("data: "):]) for line in r.text.splitlines() if line.startswith("data: ")]
+            assert events[-1]["type"] == "done", "SSE stream did not complete"
+            assert "".join(e.get("text", "") for e in events) == "Run systemctl restart.", "SSE text mismatch"
+
+            with client.websocket_connect("/ws/chat") as ws:
+                ws.send_text("{not json")
+                assert ws.receive_json()["type"] == "error", "Bad frame not rejected"
+                ws.send_json({"message": "How do I restart it?"})
+                assert read_ws_turn(ws)[-1]["type"] == "done", "Session did not survive a bad frame"
+
+        # stream_tokens: decoding stops once the consumer goes away
+        closed = threading.Event()
+        class SlowPipeline:
+            def generate(self, route, messages, result):
+                try:
+                    for i in range(500):
+                        time.sleep(0.01)
+                        yield f"t{i}"
+                finally:
+                    closed.set()
+
+        async def first_token():
+            tokens = main_server.stream_tokens(None, [], {})
+            token = await tokens.__anext__()
+            await tokens.aclose()
+            return token
+
+        saved_pipeline, main_server.pipeline = main_server.pipeline, SlowPipeline()
+        try:
+            assert asyncio.run(first_token()) == "t0", "Token not streamed"
+            assert closed.wait(2), "Decode not stopped after the consumer left"
+        finally:
+            main_server.pipeline = saved_pipeline
+
+        # Failed load: liveness fails and the process asks to exit (supervisor restarts it)
+        exits = []
+        main_server.request_exit = lambda: exits.append(True)
+        os.remove(model_path)
+        asyncio.run(main_server.startup())
+        assert main_server.readiness["state"] == "failed" and exits, "Failed startup kept running"
+        assert TestClient(main_server.app).get("/healthz").status_code == 503, "Liveness OK after failed startup"
+    finally:
+        loaded.set()
+        sys.modules.pop("main_server", None)
+        if saved_llama is not None:
+            sys.modules["llama_cpp"] = saved_llama
+        else:
+            sys.modules.pop("llama_cpp", None)
+        for k, v in saved_env.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        shutil.rmtree(base)
+    print("[PASS] Server")
+
 if __name__ == "__main__":
     print("=== NEURO-LITE TEST SUITE ===")
     try:
         test_emotional_analyzer()
         test_rag_engine()
+        test_rag_prewarm()
         test_context_manager()
         test_post_processor()
+        test_stream_coalescer()
+        test_static_assets()
+        test_model_router()
+        test_eval_pipeline()
+        test_profiler()
+        test_generation_policy()
         test_validator()
+        test_validation_pipeline()
+        test_distiller()
+        test_knowledge_artifact()
+        test_server()
         print("\n=== ALL TESTS PASSED ===")
     except AssertionError as e:
         print(f"\n[FAIL] Test Assertion Error: {e}")